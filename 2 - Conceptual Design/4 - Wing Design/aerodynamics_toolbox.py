@@ -2,155 +2,271 @@
 
 import os
 import subprocess
+import tempfile
 import numpy as np
 
-from scipy import interpolate
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
 
+from airfoil_database import load_airfoil_database
 
-def runXfoil(airfoil_name, Re, alpha_min, alpha_max, alpha_step):
+XFOIL_PATH = os.environ.get('XFOIL_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'xfoil', 'xfoil.exe'))
+XFOIL_TIMEOUT = 60  # s
+
+_AIRFOIL_DATABASE = None
+
+
+def runXfoil(airfoil_name, Re, alpha_min, alpha_max, alpha_step,
+             max_retries=3):
     """Run XFoil for the given geometry at the given flow conditions."""
-    if os.path.exists('xfoil/polar_file.txt'):
-        os.remove('xfoil/polar_file.txt')
-
-    i, polar_file_size = 0, 0
-    while polar_file_size == 0:
-        input_file = open('xfoil/xfoil_input.in', 'w')
-        input_file.write('LOAD {0}.dat\n'.format(airfoil_name))
-        input_file.write(airfoil_name + '\n')
-        input_file.write("PANE\n")
-        input_file.write('OPER\n')
-        input_file.write('Visc {0}\n'.format(Re))
-        input_file.write("TYPE 1\n")
-        input_file.write('PACC\n')
-        input_file.write('polar_file.txt\n\n')
-        input_file.write('ITER {0}\n'.format(100 + 10*i))
-        input_file.write('ASeq {0} {1} {2}\n'.format(alpha_min, alpha_max,
-                                                     alpha_step))
-        input_file.write('\n\n')
-        input_file.write('quit\n')
-        input_file.close()
-
-        subprocess.call('xfoil.exe < xfoil_input.in', shell=True, cwd='xfoil')
-
-        polar_file = np.loadtxt('xfoil/polar_file.txt', skiprows=12)
-        polar_file_size = np.size(polar_file)
-
-        i += 1
-
-        os.remove('xfoil/xfoil_input.in')
-        os.remove('xfoil/{0}.dat'.format(airfoil_name))
-
-    polar_array = np.vstack((
-        np.flipud(polar_file[int(alpha_max*(1//alpha_step) + 1):, :]),
-        polar_file[1:int(alpha_max*(1//alpha_step)+1), :]))
-    
+    coords_array = np.loadtxt('xfoil/{0}.dat'.format(airfoil_name))
+    os.remove('xfoil/{0}.dat'.format(airfoil_name))
+
+    polar_array, converged = run_xfoil_polar(coords_array, Re, alpha_min,
+                                             alpha_max, alpha_step,
+                                             max_retries=max_retries)
+    polar_array = polar_array[converged]
+
     alpha_array = polar_array[:, 0]
     cl_array = polar_array[:, 1]
     cd_array = polar_array[:, 2]
-    
-    
 
     return alpha_array, cl_array, cd_array
 
 
+def write_xfoil_input(input_file, airfoil_name, Re, alpha_commands,
+                      polar_file='polar_file.txt', n_iter=100):
+    """Write the XFoil command deck of a viscous analysis."""
+    with open(input_file, 'w') as file:
+        file.write('LOAD {0}.dat\n'.format(airfoil_name))
+        file.write(airfoil_name + '\n')
+        file.write("PANE\n")
+        file.write('OPER\n')
+        file.write('Visc {0}\n'.format(Re))
+        file.write("TYPE 1\n")
+        file.write('PACC\n')
+        file.write('{0}\n\n'.format(polar_file))
+        file.write('ITER {0}\n'.format(n_iter))
+        for alpha_command in alpha_commands:
+            file.write(alpha_command + '\n')
+        file.write('\n\n')
+        file.write('quit\n')
+
+
+def read_xfoil_polar(polar_file):
+    """Read an XFoil polar file into an alpha-sorted array of polar rows."""
+    if not os.path.exists(polar_file):
+        return np.empty((0, 7))
+    with open(polar_file) as file:
+        polar_lines = file.readlines()[12:]
+    if not polar_lines:
+        return np.empty((0, 7))
+    polar = np.loadtxt(polar_lines, ndmin=2)
+
+    # Repeated alphas keep the last converged solution XFoil wrote.
+    alpha_array = np.around(polar[::-1, 0], 3)
+    unique_index = np.unique(alpha_array, return_index=True)[1]
+
+    return polar[::-1][unique_index]
+
+
+def _get_branch_commands(alpha_array, alpha_step):
+    """Return XFoil commands sweeping outwards from 0 deg in both branches.
+
+    Each branch restarts from a fresh boundary layer at the alpha closest to
+    0 deg, where XFoil converges most easily, instead of marching from the
+    most negative alpha through the stall of the lower surface.
+    """
+    alpha_0 = alpha_array[np.argmin(np.abs(alpha_array))]
+    alpha_commands = []
+    if alpha_array[-1] > alpha_0:
+        alpha_commands.append('ASeq {0} {1} {2}'.format(
+            alpha_0, alpha_array[-1], alpha_step))
+    if alpha_array[0] < alpha_0:
+        alpha_commands.append('INIT')
+        alpha_commands.append('ASeq {0} {1} {2}'.format(
+            alpha_0, alpha_array[0], -alpha_step))
+    if len(alpha_commands) == 0:
+        alpha_commands.append('ALFA {0}'.format(alpha_0))
+
+    return alpha_commands
+
+
+def _get_retry_commands(alpha_array, converged):
+    """Return XFoil commands re-running only the non-converged alphas.
+
+    Each retry is a fresh XFoil run, so no converged boundary layer is
+    carried over: failed alphas are visited outwards from 0 deg in each
+    branch, the first one of a branch starting from a fresh solution and
+    every other one from the solution at the previous failed alpha.
+    """
+    failed_alphas = alpha_array[~converged]
+    positive_alphas = failed_alphas[failed_alphas >= 0]
+    negative_alphas = failed_alphas[failed_alphas < 0][::-1]
+
+    alpha_commands = ['ALFA {0}'.format(alpha) for alpha in positive_alphas]
+    if len(negative_alphas):
+        alpha_commands.append('INIT')
+        alpha_commands.extend('ALFA {0}'.format(alpha)
+                              for alpha in negative_alphas)
+
+    return alpha_commands
+
+
+def run_xfoil_polar(coords_array, Re, alpha_min, alpha_max, alpha_step,
+                    max_retries=3, xfoil_path=XFOIL_PATH,
+                    timeout=XFOIL_TIMEOUT):
+    """Run an XFoil alpha sweep with a bounded convergence retry budget.
+
+    The sweep is split into a positive and a negative branch starting from
+    0 deg. Each retry raises the iteration limit and re-runs only the alphas
+    that failed so far. An XFoil run still going after timeout seconds is
+    killed and counts as a failed attempt, keeping the alphas it wrote
+    before hanging. Returns the polar rows on the requested alpha grid,
+    NaN where XFoil never converged, and the per-alpha convergence mask.
+    """
+    alpha_array = np.around(np.arange(alpha_min, alpha_max + alpha_step/2,
+                                      alpha_step), 3)
+    polar_array = np.full((len(alpha_array), 7), np.nan)
+    polar_array[:, 0] = alpha_array
+    converged = np.zeros(len(alpha_array), dtype=bool)
+
+    airfoil_name = 'airfoil'
+    with tempfile.TemporaryDirectory(prefix='xfoil_') as work_dir:
+        np.savetxt(os.path.join(work_dir, airfoil_name + '.dat'),
+                   coords_array, fmt='%.4f')
+        input_file = os.path.join(work_dir, 'xfoil_input.in')
+
+        for i in range(max_retries + 1):
+            if i == 0:
+                alpha_commands = _get_branch_commands(alpha_array, alpha_step)
+            else:
+                alpha_commands = _get_retry_commands(alpha_array, converged)
+            polar_file = 'polar_file_{0}.txt'.format(i)
+            write_xfoil_input(input_file, airfoil_name, Re, alpha_commands,
+                              polar_file, n_iter=100*(i + 1))
+
+            with open(input_file) as stdin:
+                try:
+                    subprocess.run([xfoil_path], stdin=stdin,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL, cwd=work_dir,
+                                   timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    pass
+
+            polar = read_xfoil_polar(os.path.join(work_dir, polar_file))
+            polar_index = np.searchsorted(alpha_array,
+                                          np.around(polar[:, 0], 3))
+            on_grid = (polar_index < len(alpha_array)) & np.isclose(
+                alpha_array[np.minimum(polar_index, len(alpha_array) - 1)],
+                polar[:, 0], atol=1e-3)
+            polar_index = polar_index[on_grid]
+            new_points = ~converged[polar_index]
+            polar_array[polar_index[new_points]] = polar[on_grid][new_points]
+            converged[polar_index] = True
+
+            if converged.all():
+                break
+
+    return polar_array, converged
+
+
+def _run_xfoil_job(coords_array, Re, alpha_range, max_retries, xfoil_path,
+                   timeout):
+    """Run a single XFoil job for the parallel runner."""
+    return run_xfoil_polar(coords_array, Re, *alpha_range,
+                           max_retries=max_retries, xfoil_path=xfoil_path,
+                           timeout=timeout)
+
+
+def run_xfoil_jobs(jobs, xfoil_path=XFOIL_PATH, n_workers=None,
+                   timeout=XFOIL_TIMEOUT, max_retries=3):
+    """Run many XFoil sweeps in parallel and yield polars as they finish.
+
+    Each job is a (coords_array, Re, (alpha_min, alpha_max, alpha_step))
+    tuple, and each yielded item is the (job_index, polar_array, converged)
+    triple of a finished job as returned by run_xfoil_polar.
+    """
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {
+            executor.submit(_run_xfoil_job, coords_array, Re, alpha_range,
+                            max_retries, xfoil_path, timeout): job_index
+            for job_index, (coords_array, Re, alpha_range) in enumerate(jobs)}
+        for future in as_completed(futures):
+            yield (futures[future],) + future.result()
+
+
+def get_airfoil_database():
+    """Return the airfoil polar database, loading it on first use."""
+    global _AIRFOIL_DATABASE
+    if _AIRFOIL_DATABASE is None:
+        _AIRFOIL_DATABASE = load_airfoil_database()
+    return _AIRFOIL_DATABASE
+
+
 def interpolate_airfoil_polar(airfoil, Re):
     """Interpolate airfoil polar using existing airfoil database."""
-    Re_array = np.arange(200000, 500000, 100000)
-
-    max_cam_array = np.arange(0.0, 6.50, 0.50)
-    max_cam_loc_array = np.arange(2.0, 6.5, 0.50)
-    max_tc_array = np.arange(12, 25.50, 0.50)
-
-    max_cam = airfoil[0]
-    max_cam_loc = airfoil[1]
-    max_tc = airfoil[2]
-
-    Re_low = Re_array[Re_array < Re][-1]
-    Re_high = Re_array[Re_array > Re][0]
-    Re_lims = [Re_low, Re_high]
-
-    max_cam_low = max_cam_array[max_cam_array <= max_cam][-1]
-    max_cam_high = max_cam_array[max_cam_array >= max_cam][0]
-    max_cam_lims = [max_cam_low, max_cam_high]
-
-    max_cam_loc_low = max_cam_loc_array[max_cam_loc_array <= max_cam_loc][-1]
-    max_cam_loc_high = max_cam_loc_array[max_cam_loc_array >= max_cam_loc][0]
-    max_cam_loc_lims = [max_cam_loc_low, max_cam_loc_high]
-
-    max_tc_low = max_tc_array[max_tc_array <= max_tc][-1]
-    max_tc_high = max_tc_array[max_tc_array >= max_tc][0]
-
-    for Re in Re_lims:
-        for max_cam in max_cam_lims:
-            for max_cam_loc in max_cam_loc_lims:
-                polar_low = np.loadtxt(
-                    'airfoil_data/{0}/{1:.2f}/{2:.2f}/{3:.2f}.txt'.format(
-                        Re, max_cam, max_cam_loc, max_tc_low))
-                polar_high = np.loadtxt(
-                    'airfoil_data/{0}/{1:.2f}/{2:.2f}/{3:.2f}.txt'.format(
-                        Re, max_cam, max_cam_loc, max_tc_high))
-                slope_num = polar_high-polar_low
-                if not slope_num.any():
-                    polar = polar_low
-                else:
-                    polar = polar_low + (max_cam_loc - max_cam_loc_low) * \
-                        slope_num/(max_cam_loc_high-max_cam_loc_low)
-
-                np.savetxt(
-                    'airfoil_interpolation/({0})({1:.2f})({2:.2f}).txt'.format(
-                        Re, max_cam, max_cam_loc), polar)
-
-            polar_low = np.loadtxt(
-                'airfoil_interpolation/({0})({1:.2f})({2:.2f}).txt'.format(
-                    Re, max_cam, max_cam_loc_low))
-            polar_high = np.loadtxt(
-                'airfoil_interpolation/({0})({1:.2f})({2:.2f}).txt'.format(
-                    Re, max_cam, max_cam_loc_high))
-            slope_num = polar_high-polar_low
-            if not slope_num.any():
-                polar = polar_low
-            else:
-                polar = polar_low + (max_cam_loc - max_cam_loc_low) * \
-                    slope_num/(max_cam_loc_high-max_cam_loc_low)
-
-            np.savetxt('airfoil_interpolation/({0})({1:.2f}).txt'.format(
-                Re, max_cam), polar)
-
-        polar_low = np.loadtxt(
-            'airfoil_interpolation/({0})({1:.2f}).txt'.format(Re, max_cam_low))
-        polar_high = np.loadtxt(
-            'airfoil_interpolation/({0})({1:.2f}).txt'.format(
-                Re, max_cam_high))
-        slope_num = polar_high-polar_low
-        if not slope_num.any():
-            polar = polar_low
-        else:
-            polar = polar_low + (max_cam - max_cam_low) *\
-                slope_num/(max_cam_high-max_cam_low)
-
-        np.savetxt('airfoil_interpolation/({0}).txt'.format(Re), polar)
-
-    polar_low = np.loadtxt('airfoil_interpolation/({0}).txt'.format(Re_low))
-    polar_high = np.loadtxt('airfoil_interpolation/({0}).txt'.format(Re_high))
-    slope_num = polar_high-polar_low
-    if not slope_num.any():
-        polar = polar_low
-    else:
-        polar = polar_low + (Re - Re_low) * slope_num/(Re_high - Re_low)
+    alpha_array, cl_array, cd_array = get_airfoil_database().interpolate(
+        airfoil, Re)
 
-    for file in os.listdir('airfoil_interpolation'):
-        os.remove('airfoil_interpolation/' + file)
+    alpha_array = np.around(alpha_array, 2)
+    cl_array = np.around(cl_array, 4)
+    cd_array = np.around(cd_array, 4)
 
-    alpha_array = np.around(polar[:, 0], 2)
-    cl_array = np.around(polar[:, 1], 4)
-    cd_array = np.around(polar[:, 2], 4)
+    return alpha_array, cl_array, cd_array
+
+
+def interpolate_airfoil_polars(airfoils, Re):
+    """Interpolate the polars of many airfoils in one vectorized pass."""
+    alpha_array, cl_array, cd_array = \
+        get_airfoil_database().interpolate_batch(airfoils, Re)
+
+    alpha_array = np.around(alpha_array, 2)
+    cl_array = np.around(cl_array, 4)
+    cd_array = np.around(cd_array, 4)
 
     return alpha_array, cl_array, cd_array
 
 
+def get_section_drag(cl, alpha_array, cl_array, cd_array):
+    """Return the 2D angle of attack and drag coefficient at a given cl.
+
+    The lift curve is only read up to its maximum, and sections that can
+    not reach cl within the polar are penalized as stalled.
+    """
+    converged = np.isfinite(cl_array) & np.isfinite(cd_array)
+    alpha_array = alpha_array[converged]
+    cl_array = cl_array[converged]
+    cd_array = cd_array[converged]
+    if len(cl_array) < 2:
+        return np.nan, 1
+
+    i_max = np.argmax(cl_array)
+    cl_attached = np.maximum.accumulate(cl_array[:i_max + 1])
+    if cl < cl_attached[0] or cl > cl_attached[-1]:
+        return np.nan, 1
+
+    alpha = float(np.around(np.interp(cl, cl_attached,
+                                      alpha_array[:i_max + 1]), 2))
+    cd = float(np.around(np.interp(alpha, alpha_array, cd_array), 5))
+
+    return alpha, cd
+
+
 def get_3D_aerodynamics(AR, Lambda_midc, cl_r, alpha_array, cl_array,
                         cd_array):
-    """Convert 2D lift curve into 3D lift curve."""
+    """Convert 2D lift curve into 3D lift curve.
+
+    Polars with fewer than two points, such as those interpolated next to
+    empty polars of the airfoil database, are penalized as stalled.
+    """
+    from scipy import interpolate
+
+    if len(cl_array) < 2:
+        return np.nan, 1
+
     cl_alpha_fit = interpolate.interp1d(alpha_array, cl_array,
                                         fill_value='extrapolate')
     cd_alpha_fit = interpolate.interp1d(alpha_array, cd_array,
@@ -181,4 +297,74 @@ def get_3D_aerodynamics(AR, Lambda_midc, cl_r, alpha_array, cl_array,
         CDp = float(np.around(cd_alpha_fit(alpha), 5))
     else:
         CDp = 1
-    return alpha, CDp
\ No newline at end of file
+    return alpha, CDp
+
+
+def _interpolate_rows(x_new, x_array, y_array):
+    """Linearly interpolate and extrapolate each row of a stack of curves."""
+    sort_index = np.argsort(x_array, axis=1, kind='mergesort')
+    x_array = np.take_along_axis(x_array, sort_index, axis=1)
+    y_array = np.take_along_axis(y_array, sort_index, axis=1)
+
+    x_new = np.asarray(x_new, dtype=float)
+    x_new = x_new.reshape(len(x_array), -1)
+    hi = np.sum(x_array[:, None, :] < x_new[:, :, None], axis=2)
+    hi = np.clip(hi, 1, x_array.shape[1] - 1)
+    lo = hi - 1
+
+    x_lo = np.take_along_axis(x_array, lo, axis=1)
+    x_hi = np.take_along_axis(x_array, hi, axis=1)
+    y_lo = np.take_along_axis(y_array, lo, axis=1)
+    y_hi = np.take_along_axis(y_array, hi, axis=1)
+
+    slope = (y_hi - y_lo)/(x_hi - x_lo)
+
+    return slope*(x_new - x_lo) + y_lo
+
+
+def get_3D_aerodynamics_batch(AR, Lambda_midc, cl_r, alpha_array, cl_arrays,
+                              cd_arrays):
+    """Convert stacks of 2D lift curves into 3D ones in a vectorized pass."""
+    cl_arrays = np.atleast_2d(cl_arrays)
+    cd_arrays = np.atleast_2d(cd_arrays)
+    n_curves = len(cl_arrays)
+
+    AR = np.broadcast_to(np.asarray(AR, dtype=float), n_curves)
+    Lambda_midc = np.broadcast_to(np.asarray(Lambda_midc, dtype=float),
+                                  n_curves)
+    cl_r = np.broadcast_to(np.asarray(cl_r, dtype=float), n_curves)
+    alpha_arrays = np.broadcast_to(alpha_array, cl_arrays.shape)
+
+    alpha_zl = _interpolate_rows(np.zeros(n_curves), cl_arrays,
+                                 alpha_arrays)[:, 0]
+
+    alpha_lin = np.linspace(alpha_zl, 10, 21, axis=1)
+    cl_lin = _interpolate_rows(alpha_lin, alpha_arrays, cl_arrays)
+    cl_alpha = np.mean((cl_lin[:, 1:] - cl_lin[:, :-1]) /
+                       (alpha_lin[:, 1:] - alpha_lin[:, :-1]), axis=1)
+    CL_alpha = np.deg2rad(
+        2*np.pi*AR/(2 + np.sqrt((AR/(np.rad2deg(cl_alpha) /
+                                     (2*np.pi)))**2 *
+                                (1 + np.tan(Lambda_midc)**2) + 4)))
+    CL_lin = (CL_alpha/cl_alpha)[:, None]*(
+        cl_lin - cl_alpha[:, None]*alpha_lin) + CL_alpha[:, None]*alpha_lin
+
+    alpha = np.around(_interpolate_rows(cl_r, CL_lin, alpha_lin)[:, 0], 2)
+
+    CDp = np.ones(n_curves)
+    attached = alpha < 15
+    if np.any(attached):
+        CDp[attached] = np.around(_interpolate_rows(
+            alpha[attached], alpha_arrays[attached],
+            cd_arrays[attached])[:, 0], 5)
+
+    # Polars with non-converged alphas fall back to the scalar conversion
+    # over their converged points, as if they had been read from file, and
+    # are penalized as stalled when too few points converged.
+    converged = np.isfinite(cl_arrays) & np.isfinite(cd_arrays)
+    for i in np.flatnonzero(~np.all(converged, axis=1)):
+        alpha[i], CDp[i] = get_3D_aerodynamics(
+            AR[i], Lambda_midc[i], cl_r[i], alpha_arrays[i][converged[i]],
+            cl_arrays[i][converged[i]], cd_arrays[i][converged[i]])
+
+    return alpha, CDp
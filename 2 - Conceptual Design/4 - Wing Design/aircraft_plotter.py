@@ -1,49 +1,58 @@
 """Provide tools for creating parametirc aircraft geometry."""
 
+import os
 import numpy as np
-import matplotlib.pyplot as plt
-import openvsp as vsp
 
-
-def naca_4_series(max_camber, max_camber_loc, max_tc, n_points,
-                  plot_switch=False):
-    """Plot NACA 4-Series airfoil with the given characteristics."""
-    airfoil_name = 'NACA({0:.2f})({1:.2f})({2:.2f})'.format(
-        max_camber, max_camber_loc, max_tc)
-    x_coords = np.linspace(0, 1, n_points)
-
-    def get_thickness_dist(x_coords):
-
-        t_max = max_tc/100
-        t_dist = t_max*(1.4845*np.sqrt(x_coords) - 0.63*x_coords -
-                        1.758*x_coords**2 + 1.4215*x_coords**3 -
-                        0.5075*x_coords**4)
-
-        return t_dist
-
-    def get_camber_curve(x_coords):
-
-        x_mc = max_camber_loc/10
-        z_mc = max_camber/100
-
-        z_mcl = np.empty(len(x_coords))
-        dz_mcldx = np.empty(len(x_coords))
-
-        for i, x_coord in enumerate(x_coords):
-            if x_coord < x_mc:
-                z_mcl[i] = z_mc/x_mc**2*(2*x_mc*x_coord-x_coord**2)
-                dz_mcldx[i] = (z_mc/x_mc**2)*(2*x_mc - 2*x_coord)
-            else:
-                z_mcl[i] = (z_mc/(1-x_mc)**2)*(
-                    1-2*x_mc + 2*x_mc*x_coord-x_coord**2)
-                dz_mcldx[i] = (z_mc/(1-x_mc)**2)*(2*x_mc - 2*x_coord)
-
-            theta = np.arctan(dz_mcldx)
-
-        return z_mcl, theta
-
-    t_dist = get_thickness_dist(x_coords)
-    z_mcl, theta = get_camber_curve(x_coords)
+from plot_recorder import recorder
+
+FONT_FILE = 'C:/Windows/Fonts/pala.ttf'
+
+
+def set_plot_style(style='darkgrid', font_file=FONT_FILE):
+    """Apply the seaborn theme and Palatino font of the report figures."""
+    import seaborn as sns
+    import matplotlib.font_manager as font_manager
+
+    sns.set_theme(style=style, font='Palatino Linotype', context='paper')
+    if os.path.exists(font_file):
+        font_manager.fontManager.addfont(font_file)
+
+
+def naca_4_series_coords(max_camber, max_camber_loc, max_tc, n_points,
+                         spacing='linear'):
+    """Return the coordinates of many NACA 4-Series airfoils at once.
+
+    The airfoil parameters broadcast against each other, and the returned
+    array has shape (..., 2*n_points, 2), running from the upper surface
+    trailing edge to the lower surface trailing edge.
+    """
+    max_camber, max_camber_loc, max_tc = np.broadcast_arrays(
+        np.asarray(max_camber, dtype=float),
+        np.asarray(max_camber_loc, dtype=float),
+        np.asarray(max_tc, dtype=float))
+    max_camber = max_camber[..., None]
+    max_camber_loc = max_camber_loc[..., None]
+    max_tc = max_tc[..., None]
+
+    if spacing == 'cosine':
+        x_coords = (1 - np.cos(np.linspace(0, np.pi, n_points)))/2
+    else:
+        x_coords = np.linspace(0, 1, n_points)
+
+    t_max = max_tc/100
+    t_dist = t_max*(1.4845*np.sqrt(x_coords) - 0.63*x_coords -
+                    1.758*x_coords**2 + 1.4215*x_coords**3 -
+                    0.5075*x_coords**4)
+
+    x_mc = max_camber_loc/10
+    z_mc = max_camber/100
+    forward = x_coords < x_mc
+    z_mcl = np.where(forward, z_mc/x_mc**2*(2*x_mc*x_coords - x_coords**2),
+                     (z_mc/(1 - x_mc)**2)*(1 - 2*x_mc + 2*x_mc*x_coords -
+                                           x_coords**2))
+    dz_mcldx = np.where(forward, (z_mc/x_mc**2)*(2*x_mc - 2*x_coords),
+                        (z_mc/(1 - x_mc)**2)*(2*x_mc - 2*x_coords))
+    theta = np.arctan(dz_mcldx)
 
     x_u = x_coords - t_dist*np.sin(theta)
     z_u = z_mcl + t_dist*np.cos(theta)
@@ -51,35 +60,56 @@ def naca_4_series(max_camber, max_camber_loc, max_tc, n_points,
     x_l = x_coords + t_dist*np.sin(theta)
     z_l = z_mcl - t_dist*np.cos(theta)
 
-    scale_factor_u = 1/x_u[-1]
-    x_u *= scale_factor_u
-    z_u *= scale_factor_u
+    scale_factor_u = 1/x_u[..., -1:]
+    x_u = x_u*scale_factor_u
+    z_u = z_u*scale_factor_u
+
+    scale_factor_l = 1/x_l[..., -1:]
+    x_l = x_l*scale_factor_l
+    z_l = z_l*scale_factor_l
+
+    return np.stack((np.concatenate((x_u[..., ::-1], x_l), axis=-1),
+                     np.concatenate((z_u[..., ::-1], z_l), axis=-1)),
+                    axis=-1)
 
-    scale_factor_l = 1/x_l[-1]
-    x_l *= scale_factor_l
-    z_l *= scale_factor_l
+
+def naca_4_series(max_camber, max_camber_loc, max_tc, n_points,
+                  plot_switch=False, spacing='linear', output_dir='xfoil'):
+    """Plot NACA 4-Series airfoil with the given characteristics."""
+    airfoil_name = 'NACA({0:.2f})({1:.2f})({2:.2f})'.format(
+        max_camber, max_camber_loc, max_tc)
+
+    coords_array = naca_4_series_coords(max_camber, max_camber_loc, max_tc,
+                                        n_points, spacing)
+    x_u, z_u = coords_array[n_points - 1::-1].T
+    x_l, z_l = coords_array[n_points:].T
 
     if plot_switch:
-        fig = plt.figure(dpi=1200)
+        fig = recorder.figure(airfoil_name)
         ax = fig.add_subplot(111)
         ax.plot(x_u, z_u, 'k')
         ax.plot(x_l, z_l, 'k')
         ax.axis('equal')
         ax.set_title(airfoil_name)
 
-    coords_array = np.vstack((np.concatenate((x_u[::-1], x_l)),
-                              np.concatenate((z_u[::-1], z_l)))).T
-
-    np.savetxt('xfoil/' + airfoil_name + '.dat', coords_array, fmt='%.4f')
+    if output_dir is not None:
+        np.savetxt(os.path.join(output_dir, airfoil_name + '.dat'),
+                   coords_array, fmt='%.4f')
 
     return coords_array
 
 
 def create_VSP_wing(wing_span, planform, airfoil, alpha_i):
-    """Create wing in OpenVSP dexcribed by the given characteristics."""
-    max_camber = airfoil[0]
-    max_camber_loc = airfoil[1]
-    max_tc = airfoil[2]
+    """Create wing in OpenVSP dexcribed by the given characteristics.
+
+    airfoil is either a single NACA 4-series section applied to the whole
+    wing or a list with one section per planform station.
+    """
+    import openvsp as vsp
+
+    airfoils = np.array(airfoil, dtype=float)
+    if airfoils.ndim == 1:
+        airfoils = np.tile(airfoils, (len(planform), 1))
 
     vsp.VSPCheckSetup()
    
@@ -103,7 +133,7 @@ def create_VSP_wing(wing_span, planform, airfoil, alpha_i):
         vsp.SetParmValUpdate(wing_id, 'Sweep_Location', 'XSec_{0}'.format(
             i+1), 0.25)
 
-    for i in range(len(planform)):
+    for i, (max_camber, max_camber_loc, max_tc) in enumerate(airfoils):
         vsp.SetParmValUpdate(wing_id, 'Camber', 'XSecCurve_{0}'.format(i),
                              max_camber/100)
         vsp.SetParmValUpdate(wing_id, 'CamberLoc', 'XSecCurve_{0}'.format(i),
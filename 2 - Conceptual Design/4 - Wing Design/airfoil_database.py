@@ -0,0 +1,233 @@
+"""Provide an in-memory NACA 4-series polar database."""
+
+import os
+import json
+import itertools
+import numpy as np
+
+from data_cache import CachedDatabase
+
+DATA_DIR = 'airfoil_data'
+CACHE_FILE = 'airfoil_data.npy'
+MANIFEST_FILE = 'airfoil_data_manifest.json'
+
+
+class AirfoilDatabase(CachedDatabase):
+    """Dense grid of airfoil polars indexed by (Re, cam, loc, t/c, alpha)."""
+
+    # Polars are cached in single precision to halve the cache file
+    cache_fields = (('Re_array', '<f8'), ('max_cam_array', '<f8'),
+                    ('max_cam_loc_array', '<f8'), ('max_tc_array', '<f8'),
+                    ('alpha_array', '<f8'), ('polar_array', '<f4'))
+
+    def __init__(self, Re_array, max_cam_array, max_cam_loc_array,
+                 max_tc_array, alpha_array, polar_array):
+        self.Re_array = np.asarray(Re_array, dtype=float)
+        self.max_cam_array = np.asarray(max_cam_array, dtype=float)
+        self.max_cam_loc_array = np.asarray(max_cam_loc_array, dtype=float)
+        self.max_tc_array = np.asarray(max_tc_array, dtype=float)
+        self.alpha_array = np.asarray(alpha_array, dtype=float)
+        self.polar_array = polar_array
+
+    @property
+    def axes(self):
+        """Return the (Re, max camber, camber location, t/c) grid axes."""
+        return (self.Re_array, self.max_cam_array, self.max_cam_loc_array,
+                self.max_tc_array)
+
+    @classmethod
+    def from_directory(cls, data_dir=DATA_DIR):
+        """Load every polar file of the nested airfoil data directory."""
+        polar_files = []
+        for root, _, files in os.walk(data_dir):
+            grid_dirs = os.path.relpath(root, data_dir).split(os.sep)
+            if len(grid_dirs) == 3:
+                polar_files.extend(tuple(grid_dirs) + (file[:-4],)
+                                   for file in files if file.endswith('.txt'))
+
+        # The grid axes are the union of the values found at each level, so
+        # that points appended by build_airfoil_data extend the grid.
+        grid_names = [sorted(set(names), key=float)
+                      for names in zip(*polar_files)]
+        grid_shape = tuple(len(names) for names in grid_names)
+
+        polars = {}
+        for polar_names in polar_files:
+            polar_file = os.path.join(data_dir, *polar_names[:3],
+                                      polar_names[3] + '.txt')
+            if os.path.getsize(polar_file):
+                index = tuple(names.index(name) for names, name in zip(
+                    grid_names, polar_names))
+                # Single-point polars are stored as one value per line.
+                polars[index] = np.loadtxt(polar_file).reshape(-1, 7)
+
+        # Non-converged XFoil points are missing from their polar file, so
+        # the alpha grid is the union of every alpha found in the database.
+        alpha_array = np.unique(np.concatenate(
+            [np.around(polar[:, 0], 2) for polar in polars.values()]))
+
+        polar_array = np.full(grid_shape + (len(alpha_array), 7), np.nan)
+        for index, polar in polars.items():
+            alpha_index = np.searchsorted(alpha_array,
+                                          np.around(polar[:, 0], 2))
+            polar_array[index][alpha_index] = polar
+        polar_array[..., 0] = alpha_array
+
+        return cls(*[[float(name) for name in names]
+                     for names in grid_names], alpha_array, polar_array)
+
+    def _interpolate(self, points):
+        """Multilinearly interpolate the polar grid at (N, 4) points."""
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+
+        index_list, weight_list = [], []
+        for axis, values in zip(self.axes, points.T):
+            if np.any(values < axis[0]) or np.any(values > axis[-1]):
+                raise ValueError(
+                    'Point outside of the airfoil database range '
+                    '[{0}, {1}].'.format(axis[0], axis[-1]))
+            index = np.clip(np.searchsorted(axis, values, side='right') - 1,
+                            0, len(axis) - 2)
+            weight = (values - axis[index])/(axis[index + 1] - axis[index])
+            index_list.append(index)
+            weight_list.append(weight)
+
+        polar = np.zeros((len(points),) + self.polar_array.shape[-2:])
+        for corner in itertools.product((0, 1), repeat=len(self.axes)):
+            corner_weight = np.ones(len(points))
+            corner_index = []
+            for offset, index, weight in zip(corner, index_list,
+                                             weight_list):
+                corner_weight *= weight if offset else 1 - weight
+                corner_index.append(index + offset)
+
+            # Skip zero-weight corners so that incomplete neighbouring polars
+            # do not leak NaNs into points lying exactly on the grid.
+            active = corner_weight > 0
+            if not active.any():
+                continue
+            corner_polar = self.polar_array[tuple(
+                index[active] for index in corner_index)]
+            polar[active] += corner_weight[active, None, None]*corner_polar
+
+        return polar
+
+    def interpolate_batch(self, airfoils, Re):
+        """Return the interpolated polars of an (N, 3) array of airfoils."""
+        airfoils = np.atleast_2d(np.asarray(airfoils, dtype=float))
+        Re = np.broadcast_to(np.asarray(Re, dtype=float), len(airfoils))
+        polar = self._interpolate(np.column_stack((Re, airfoils)))
+
+        return self.alpha_array, polar[..., 1], polar[..., 2]
+
+    def interpolate(self, airfoil, Re):
+        """Return the interpolated polar of a single airfoil.
+
+        Non-converged alphas are dropped, so that next to the empty polars
+        of the database fewer than two points, or none, may remain.
+        """
+        max_cam, max_cam_loc, max_tc = airfoil
+        polar = self._interpolate([[Re, max_cam, max_cam_loc, max_tc]])[0]
+        polar = polar[np.all(np.isfinite(polar), axis=1)]
+
+        return polar[:, 0], polar[:, 1], polar[:, 2]
+
+
+def build_cache(data_dir=DATA_DIR, cache_file=CACHE_FILE):
+    """Parse the airfoil data directory and pack it into the cache file."""
+    return AirfoilDatabase.build_cache(data_dir, cache_file)
+
+
+def load_airfoil_database(data_dir=DATA_DIR, cache_file=CACHE_FILE):
+    """Load the polar database from its cache, rebuilding it when stale."""
+    return AirfoilDatabase.load(data_dir, cache_file)
+
+
+def get_polar_file(Re, max_cam, max_cam_loc, max_tc, data_dir=DATA_DIR):
+    """Return the path of a polar file in the airfoil data directory."""
+    return os.path.join(data_dir, '{0:.0f}'.format(Re),
+                        '{0:.2f}'.format(max_cam),
+                        '{0:.2f}'.format(max_cam_loc),
+                        '{0:.2f}.txt'.format(max_tc))
+
+
+def _load_manifest(manifest_file):
+    """Return the failed and non-converged cases of previous builds."""
+    if not os.path.exists(manifest_file):
+        return {'failed': {}, 'non_converged': {}}
+    with open(manifest_file) as file:
+        return json.load(file)
+
+
+def _save_manifest(manifest, manifest_file):
+    """Atomically write the build manifest."""
+    with open(manifest_file + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def build_airfoil_data(Re_array, max_cam_array, max_cam_loc_array,
+                       max_tc_array, alpha_range=(-5, 5, 0.25),
+                       data_dir=DATA_DIR, manifest_file=MANIFEST_FILE,
+                       n_points=100, retry_failed=False, **xfoil_kwargs):
+    """Run XFoil for the grid points missing from the airfoil data directory.
+
+    Airfoil sections are generated in memory with naca_4_series_coords.
+
+    Polar files are written as soon as their XFoil run finishes, so an
+    interrupted build resumes where it stopped when called again. Runs
+    without a single converged alpha are listed as failed in the manifest
+    and skipped on later builds unless retry_failed is set, while partially
+    converged polars are written and their missing alphas listed.
+    """
+    from aerodynamics_toolbox import run_xfoil_jobs
+    from aircraft_plotter import naca_4_series_coords
+
+    manifest = _load_manifest(manifest_file)
+
+    cases = []
+    for Re, max_cam, max_cam_loc, max_tc in itertools.product(
+            Re_array, max_cam_array, max_cam_loc_array, max_tc_array):
+        polar_file = get_polar_file(Re, max_cam, max_cam_loc, max_tc,
+                                    data_dir)
+        if os.path.exists(polar_file):
+            continue
+        case_name = os.path.relpath(polar_file, data_dir)
+        if case_name in manifest['failed'] and not retry_failed:
+            continue
+        cases.append((polar_file, Re, (max_cam, max_cam_loc, max_tc)))
+
+    airfoils = np.array([airfoil for _, _, airfoil in cases]).reshape(-1, 3)
+    coords_arrays = naca_4_series_coords(*airfoils.T, n_points)
+    jobs = [(coords_array, Re, alpha_range)
+            for coords_array, (_, Re, _) in zip(coords_arrays, cases)]
+
+    for job_index, polar, converged in run_xfoil_jobs(jobs, **xfoil_kwargs):
+        polar_file = cases[job_index][0]
+        case_name = os.path.relpath(polar_file, data_dir)
+        if not converged.any():
+            manifest['failed'][case_name] = \
+                manifest['failed'].get(case_name, 0) + 1
+            _save_manifest(manifest, manifest_file)
+            continue
+
+        os.makedirs(os.path.dirname(polar_file), exist_ok=True)
+        np.savetxt(polar_file + '.tmp', polar[converged], fmt='%.4f')
+        os.replace(polar_file + '.tmp', polar_file)
+
+        manifest['failed'].pop(case_name, None)
+        if not converged.all():
+            manifest['non_converged'][case_name] = \
+                polar[~converged, 0].tolist()
+        _save_manifest(manifest, manifest_file)
+
+    return manifest
+
+
+def main():
+    build_cache()
+    print('--> Airfoil database packed into {0}'.format(CACHE_FILE))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,37 +2,40 @@
 
 import random
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-import matplotlib.font_manager as font_manager
+from functools import partial
 
 from deap import base
 from deap import creator
 from deap import tools
-from deap import algorithms
 
-from ambiance import Atmosphere
-
-from aerodynamics_toolbox import interpolate_airfoil_polar
+from aerodynamics_toolbox import interpolate_airfoil_polars
 from aerodynamics_toolbox import get_3D_aerodynamics
+from aerodynamics_toolbox import get_3D_aerodynamics_batch
+from aerodynamics_toolbox import get_section_drag
 from aerodynamics_toolbox import runXfoil
+from aerodynamics_toolbox import get_airfoil_database
 
 from aircraft_plotter import naca_4_series
 from aircraft_plotter import create_VSP_wing
+from aircraft_plotter import set_plot_style
+
+from atmosphere import get_air_properties
 
-sns.set_theme(style='darkgrid', font='Palatino Linotype', context='paper')
-FONT_FILE = 'C:/Windows/Fonts/pala.ttf'
-font_manager.fontManager.addfont(FONT_FILE)
+from ga_toolbox import EvaluationPool
+from ga_toolbox import FitnessCache
+from ga_toolbox import StoppingCriteria
+from ga_toolbox import SurrogateScreen
+from ga_toolbox import ea_simple
+from ga_toolbox import get_batch_map
+from ga_toolbox import get_pool_backend
 
+from plot_recorder import recorder
 
 # %% Problem constants
 
 H = 640  # m AMSL
 V = 22  # m/s
-g = Atmosphere(H).grav_accel[0]  # m/s^2
-rho = Atmosphere(H).density[0]  # kg/m^3
-nu = Atmosphere(H).kinematic_viscosity[0]  # m^2/s
 
 WL = 23.239  # kg/m^2
 W0 = 10  # kg
@@ -63,22 +66,83 @@ MGC = round(np.sum((c_array[:-1] + c_array[1:])/2*S_array)/(S_real/2), 3)
 Lambda_midc = np.sum(np.arctan(
     (c_array[1:] - c_array[0:-1])/(4*dy))*S_array)/S_real
 
-L = W0*g
-CL = round(L/(0.5*rho*V**2*S_real), 4)
 
-Lr = L/(np.pi/4*b)
-cl_r = round(2*Lr/(rho*V**2*c_array[0]), 4)
-Re = (V*MGC)/nu
+def get_flight_condition():
+    """Return the air properties, wing loads and Re of the design point.
+
+    The air properties are looked up on the first call instead of at
+    import, so that pool workers and batch jobs import this module cheaply.
+    """
+    g, rho, nu = get_air_properties(H)  # m/s^2, kg/m^3, m^2/s
+
+    L = W0*g
+    CL = round(L/(0.5*rho*V**2*S_real), 4)
+
+    Lr = L/(np.pi/4*b)
+    cl_r = round(2*Lr/(rho*V**2*c_array[0]), 4)
+    Re = (V*MGC)/nu
+
+    return {'rho': rho, 'nu': nu, 'L': L, 'CL': CL, 'Lr': Lr, 'cl_r': cl_r,
+            'Re': Re}
+
+
+# %% Sweep - Airfoil
+
+
+def get_gene_airfoils():
+    """Return every airfoil reachable by the integer genes of the GA."""
+    return np.array(np.meshgrid(
+        np.arange(max_camber_min, max_camber_max + 1),
+        np.arange(max_camber_loc_min, max_camber_loc_max + 1),
+        np.arange(max_tc_min, max_tc_max + 1),
+        indexing='ij')).reshape(3, -1).T
+
+
+def sweep_airfoils(Re, AR, Lambda_midc, cl_r, airfoils=None,
+                   best_only=False):
+    """Evaluate every airfoil at once and rank them by wing CDp.
+
+    By default the whole NACA 4-series grid of the airfoil database is
+    swept; pass get_gene_airfoils() to restrict it to the GA design space
+    when checking its hall of fame against the global optimum.
+    """
+    if airfoils is None:
+        database = get_airfoil_database()
+        airfoils = np.array(np.meshgrid(
+            database.max_cam_array, database.max_cam_loc_array,
+            database.max_tc_array, indexing='ij')).reshape(3, -1).T
+    airfoils = np.asarray(airfoils, dtype=float)
+
+    alpha_array, cl_arrays, cd_arrays = interpolate_airfoil_polars(airfoils,
+                                                                   Re)
+    alpha, CDp = get_3D_aerodynamics_batch(AR, Lambda_midc, cl_r,
+                                           alpha_array, cl_arrays, cd_arrays)
+
+    sweep_table = np.empty(len(airfoils), dtype=[
+        ('max_camber', float), ('max_camber_loc', float), ('max_tc', float),
+        ('alpha', float), ('CDp', float)])
+    sweep_table['max_camber'] = airfoils[:, 0]
+    sweep_table['max_camber_loc'] = airfoils[:, 1]
+    sweep_table['max_tc'] = airfoils[:, 2]
+    sweep_table['alpha'] = alpha
+    sweep_table['CDp'] = CDp
+    sweep_table = sweep_table[np.lexsort((sweep_table['alpha'],
+                                          sweep_table['CDp']))]
+
+    if best_only:
+        return sweep_table[0]
+    return sweep_table
+
 
 # %% GA - Airfoil
 
+_evaluation_state = {}
 
-def optimize_airfoil(population_size, max_generations, p_crossover,
-                     p_mutation):
-    """Airfoil optimization algorithm."""
-    hall_of_fame_size = 1
 
-    toolbox = base.Toolbox()
+def create_types():
+    """Create the DEAP fitness and individual classes."""
+    if hasattr(creator, 'Individual'):
+        return
 
     # Create fitness function class
     creator.create('FitnessMin', base.Fitness, weights=(-1.0,))
@@ -86,17 +150,61 @@ def optimize_airfoil(population_size, max_generations, p_crossover,
     # Create individual class
     creator.create('Individual', list, fitness=creator.FitnessMin)
 
-    # Random wing sections generator
-    def get_airfoil(y_stations):
 
-        max_camber = round(random.randint(max_camber_min, max_camber_max), 0)
-        max_camber_loc = round(random.randint(max_camber_loc_min,
-                                              max_camber_loc_max), 0)
-        max_tc = round(random.randint(max_tc_min, max_tc_max), 0)
+def get_evaluation_state():
+    """Return the flight condition shared with the fitness evaluators."""
+    flight_condition = get_flight_condition()
 
-        return [max_camber, max_camber_loc, max_tc]
+    return {'Re': flight_condition['Re'], 'AR': AR,
+            'Lambda_midc': Lambda_midc, 'cl_r': flight_condition['cl_r']}
 
-    toolbox.register('generate_airfoil', get_airfoil, y_stations)
+
+def init_evaluation(state):
+    """Set the flight condition used by the fitness evaluators."""
+    create_types()
+    _evaluation_state.update(state)
+    get_airfoil_database()
+
+
+def evaluate_airfoil(individual):
+    """Return the wing CDp of a single wing section.
+
+    The section goes through the vectorized evaluator, so that polars with
+    non-converged alphas get the same penalty as in batched runs.
+    """
+    return evaluate_airfoils([individual])[0]
+
+
+def evaluate_airfoils(population):
+    """Return the wing CDp of a whole population in one vectorized pass."""
+    alpha_array, cl_arrays, cd_arrays = interpolate_airfoil_polars(
+        population, _evaluation_state['Re'])
+
+    CDp_array = get_3D_aerodynamics_batch(_evaluation_state['AR'],
+                                          _evaluation_state['Lambda_midc'],
+                                          _evaluation_state['cl_r'],
+                                          alpha_array, cl_arrays,
+                                          cd_arrays)[-1]
+
+    return [(CDp,) for CDp in CDp_array]
+
+
+# Random wing sections generator
+def get_airfoil():
+    """Return random NACA 4-series digits within the design space."""
+    max_camber = round(random.randint(max_camber_min, max_camber_max), 0)
+    max_camber_loc = round(random.randint(max_camber_loc_min,
+                                          max_camber_loc_max), 0)
+    max_tc = round(random.randint(max_tc_min, max_tc_max), 0)
+
+    return [max_camber, max_camber_loc, max_tc]
+
+
+def create_toolbox(evaluate, evaluate_population):
+    """Return the airfoil GA toolbox mapping onto a population evaluator."""
+    toolbox = base.Toolbox()
+
+    toolbox.register('generate_airfoil', get_airfoil)
 
     # Create individual generator
     toolbox.register('individual_creator', tools.initIterate,
@@ -106,19 +214,9 @@ def optimize_airfoil(population_size, max_generations, p_crossover,
     toolbox.register('population_creator', tools.initRepeat, list,
                      toolbox.individual_creator)
 
-    # Fitness evaluation
-    def get_wing_CDp(individual):
-
-        alpha_array, cl_array, cd_array = interpolate_airfoil_polar(individual,
-                                                                    Re)
-
-        CDp = get_3D_aerodynamics(AR, Lambda_midc, cl_r, alpha_array, cl_array,
-                                  cd_array)[-1]
-
-        return CDp,
-
     # Define geneitc operators
-    toolbox.register('evaluate', get_wing_CDp)
+    toolbox.register('evaluate', evaluate)
+    toolbox.register('map', get_batch_map(evaluate_population))
     toolbox.register('select', tools.selTournament, tournsize=6)
     # toolbox.register('mate', tools.cxSimulatedBinaryBounded,
     #                  low=(max_camber_min, max_camber_loc_min,
@@ -129,32 +227,111 @@ def optimize_airfoil(population_size, max_generations, p_crossover,
                      up=(max_camber_max, max_camber_loc_max, max_tc_max),
                      indpb=1/3)
 
+    return toolbox
+
+
+def optimize_airfoil(population_size, max_generations, p_crossover,
+                     p_mutation, batched=True, cache_size=None,
+                     cache_file=None, backend='serial', n_workers=None,
+                     patience=None, tolerance=0.0, min_diversity=None,
+                     max_time=None, checkpoint_file=None, checkpoint_freq=10,
+                     resume_from=None, screen_fraction=None,
+                     surrogate_min_samples=50, plot_switch=False):
+    """Airfoil optimization algorithm.
+
+    The run stops early after patience generations without improving the
+    minimum fitness by more than tolerance, when the population diversity
+    falls below min_diversity or after max_time seconds.
+
+    The GA state is written to checkpoint_file every checkpoint_freq
+    generations, and resume_from continues a run from such a file. The
+    fitness cache is not part of the checkpoint, so only its hit and miss
+    counts differ from an uninterrupted run. The surrogate samples and
+    counters are, so that screened runs also resume exactly.
+
+    With screen_fraction set, an RBF surrogate fitted on the exact CDp
+    samples pre-screens each generation, and only that fraction of the new
+    genomes is evaluated exactly once surrogate_min_samples are known.
+
+    backend and n_workers only apply to unbatched runs: the batched
+    evaluator processes whole generations at once in the parent process,
+    so a non-serial backend is ignored with a warning.
+
+    The convergence history and best sections are only plotted with
+    plot_switch set.
+    """
+    hall_of_fame_size = 1
+
+    create_types()
+
+    state = get_evaluation_state()
+    Re, cl_r = state['Re'], state['cl_r']
+
+    cache = FitnessCache(cache_size, cache_file)
+    flight_condition = (Re, AR, Lambda_midc, cl_r)
+
+    pool = EvaluationPool(get_pool_backend(backend, batched), n_workers,
+                          init_evaluation, (state,))
+    if pool.backend == 'process':
+        # Worker processes do not share the evaluation state of the parent
+        init_evaluation(state)
+    if batched:
+        evaluate_population = evaluate_airfoils
+    else:
+        evaluate_population = partial(pool.map, evaluate_airfoil)
+
+    evaluate_population = cache.decorate_batch(*flight_condition)(
+        evaluate_population)
+    checkpoint_extras = []
+    if screen_fraction is not None:
+        surrogate = SurrogateScreen(screen_fraction, surrogate_min_samples)
+        evaluate_population = surrogate.decorate_batch(*flight_condition)(
+            evaluate_population)
+        checkpoint_extras.append(surrogate)
+
+    toolbox = create_toolbox(evaluate_airfoil, evaluate_population)
+
     population = toolbox.population_creator(n=population_size)
 
     stats = tools.Statistics(lambda ind: ind.fitness.values)
     stats.register('min', np.min)
     stats.register('avg', np.mean)
+    stats.register('hits', lambda fitnesses: cache.hits)
+    stats.register('misses', lambda fitnesses: cache.misses)
+    if screen_fraction is not None:
+        stats.register('sur_err', lambda fitnesses: surrogate.error)
+        stats.register('saved', lambda fitnesses: surrogate.n_saved)
 
     hof = tools.HallOfFame(hall_of_fame_size)
 
-    population, logbook = algorithms.eaSimple(population, toolbox,
-                                              cxpb=p_crossover,
-                                              mutpb=p_mutation,
-                                              ngen=max_generations,
-                                              stats=stats, halloffame=hof,
-                                              verbose=True)
+    stopping = StoppingCriteria(patience, tolerance, min_diversity, max_time)
+
+    with pool:
+        population, logbook = ea_simple(population, toolbox,
+                                        cxpb=p_crossover, mutpb=p_mutation,
+                                        ngen=max_generations, stats=stats,
+                                        halloffame=hof, verbose=True,
+                                        stopping=stopping,
+                                        checkpoint_file=checkpoint_file,
+                                        checkpoint_freq=checkpoint_freq,
+                                        resume_from=resume_from,
+                                        checkpoint_extras=checkpoint_extras)
+
+    if cache_file is not None:
+        cache.save()
 
     minFitnessValues, meanFitnessValues = logbook.select("min", "avg")
 
-    fig = plt.figure(dpi=1200)
-    ax = fig.add_subplot(111)
-    ax.plot(minFitnessValues, color='red', label='Min FV')
-    ax2 = ax.twinx()
-    ax2.plot(meanFitnessValues, color='green', label='Mean FV')
-    ax.set_xlabel('Generation')
-    ax.set_ylabel(r'$\mathdefault{Minimum C_{D_{p}}}$')
-    ax2.set_ylabel(r'Average $\mathdefault{C_{D_{p}}}$')
-    ax.set_xlim(left=0)
+    if plot_switch:
+        fig = recorder.figure('airfoil_convergence')
+        ax = fig.add_subplot(111)
+        ax.plot(minFitnessValues, color='red', label='Min FV')
+        ax2 = ax.twinx()
+        ax2.plot(meanFitnessValues, color='green', label='Mean FV')
+        ax.set_xlabel('Generation')
+        ax.set_ylabel(r'$\mathdefault{Minimum C_{D_{p}}}$')
+        ax2.set_ylabel(r'Average $\mathdefault{C_{D_{p}}}$')
+        ax.set_xlim(left=0)
 
 #   hof_file = open('airfoil_hof.txt', 'w')
     for i in range(hall_of_fame_size):
@@ -165,7 +342,8 @@ def optimize_airfoil(population_size, max_generations, p_crossover,
         airfoil_name = ('NACA({0:.2f})({1:.2f})({2:.2f})'.format(
             max_cam, max_cam_loc, max_tc))
 
-        naca_4_series(max_cam, max_cam_loc, max_tc, 100, plot_switch=True)
+        naca_4_series(max_cam, max_cam_loc, max_tc, 100,
+                      plot_switch=plot_switch)
         alpha_array, cl_array, cd_array = runXfoil(airfoil_name, Re, -10, 10,
                                                    0.25)
 
@@ -185,11 +363,119 @@ def optimize_airfoil(population_size, max_generations, p_crossover,
     return best_airfoil, best_alpha_i
 
 
+# %% GA - Sections
+
+Re_cell = 1000  # Reynolds number rounding of the station conditions
+cl_cell = 0.01  # lift coefficient rounding of the station conditions
+
+
+def get_section_conditions(planform, y_stations):
+    """Return the local Re and elliptical-loading cl at each span station.
+
+    Both are rounded to the (Re_cell, cl_cell) grid, so that stations
+    landing on the same cell share a single section optimization.
+    """
+    flight_condition = get_flight_condition()
+    Lr, rho, nu = (flight_condition['Lr'], flight_condition['rho'],
+                   flight_condition['nu'])
+
+    c_array = np.asarray(planform, dtype=float)
+    y_stations = np.asarray(y_stations, dtype=float)
+
+    l_array = Lr*np.sqrt(np.clip(1 - (2*y_stations/b)**2, 0, None))
+    cl_array = 2*l_array/(rho*V**2*c_array)
+    Re_array = V*c_array/nu
+
+    return (np.around(Re_array/Re_cell)*Re_cell,
+            np.around(cl_array/cl_cell)*cl_cell)
+
+
+def evaluate_section(task):
+    """Return the 2D drag of a wing section at its station (Re, cl).
+
+    The polar keeps its non-converged alphas as NaN, as in the batch
+    evaluators, and get_section_drag penalizes sections whose polar is
+    too sparse to reach cl.
+    """
+    airfoil, Re, cl = task
+    alpha_array, cl_arrays, cd_arrays = interpolate_airfoil_polars([airfoil],
+                                                                   Re)
+
+    return get_section_drag(cl, alpha_array, cl_arrays[0], cd_arrays[0])[-1],
+
+
+def optimize_sections(population_size, max_generations, p_crossover,
+                      p_mutation, planform=planform, cache_size=None,
+                      backend='serial', n_workers=None):
+    """Pick a NACA 4-series section for each span station of a planform.
+
+    Each station is optimized for its 2D drag at the local cl of the
+    elliptical lift distribution and its local Reynolds number. The
+    section evaluations of every station are mapped onto the same
+    evaluation pool, and results are shared between stations on the same
+    (Re, cl) cell. Returns the airfoils and 2D angles of attack of the
+    stations, from root to tip.
+    """
+    create_types()
+
+    y_array = np.linspace(0, b/2, len(planform))
+    Re_array, cl_array = get_section_conditions(planform, y_array)
+
+    cache = FitnessCache(cache_size)
+    cell_sections = {}
+
+    with EvaluationPool(backend, n_workers, init_evaluation,
+                        (get_evaluation_state(),)) as pool:
+        for Re_i, cl_i in zip(Re_array, cl_array):
+            if (Re_i, cl_i) in cell_sections:
+                continue
+
+            def evaluate_population(population):
+                return pool.map(evaluate_section, [
+                    (tuple(individual), Re_i, cl_i)
+                    for individual in population])
+
+            toolbox = create_toolbox(
+                evaluate_airfoil,
+                cache.decorate_batch(Re_i, cl_i)(evaluate_population))
+
+            population = toolbox.population_creator(n=population_size)
+            hof = tools.HallOfFame(1)
+            ea_simple(population, toolbox, cxpb=p_crossover,
+                      mutpb=p_mutation, ngen=max_generations,
+                      halloffame=hof, verbose=False)
+
+            airfoil = hof.items[0]
+            alpha_array, cl_polars, cd_polars = interpolate_airfoil_polars(
+                [airfoil], Re_i)
+            alpha_i = get_section_drag(cl_i, alpha_array, cl_polars[0],
+                                       cd_polars[0])[0]
+            cell_sections[(Re_i, cl_i)] = (list(airfoil), alpha_i)
+
+    airfoils, alphas = [], []
+    for y_i, Re_i, cl_i in zip(y_array, Re_array, cl_array):
+        airfoil, alpha_i = cell_sections[(Re_i, cl_i)]
+        airfoils.append(airfoil)
+        alphas.append(alpha_i)
+        print('--> y = {0:.3f} m, Re = {1:.0f}, cl = {2:.2f}: '
+              'NACA({3:.0f})({4:.0f})({5:.0f})'.format(
+                  y_i, Re_i, cl_i, *airfoil))
+
+    print('--> {0} section optimizations for {1} stations, '
+          '{2} cache hits'.format(len(cell_sections), len(planform),
+                                  cache.hits))
+
+    return airfoils, alphas
+
+
 def main():
+    set_plot_style()
 
-    airfoil, alpha_i = optimize_airfoil(50, 20, 0.5, 0.95)
+    airfoil, alpha_i = optimize_airfoil(50, 20, 0.5, 0.95, plot_switch=True)
     create_VSP_wing(b, planform, airfoil, alpha_i)
 
+    recorder.render()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,18 @@
+"""Provide the ambient air properties of the design flight conditions."""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def get_air_properties(h):
+    """Return the gravity, density and kinematic viscosity at h m AMSL.
+
+    ambiance is only imported on the first call, and the properties of
+    each altitude are computed once per process.
+    """
+    from ambiance import Atmosphere
+
+    atmosphere = Atmosphere(h)
+
+    return (atmosphere.grav_accel[0], atmosphere.density[0],
+            atmosphere.kinematic_viscosity[0])
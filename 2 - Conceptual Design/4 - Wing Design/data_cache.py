@@ -0,0 +1,80 @@
+"""Pack data directories into memory-mapped caches kept in sync with them."""
+
+import os
+import numpy as np
+
+
+def get_source_signature(data_dir):
+    """Return the number of data files and their latest modification time."""
+    n_files, mtime = 0, 0.0
+    for root, _, files in os.walk(data_dir):
+        for file in files:
+            n_files += 1
+            mtime = max(mtime, os.path.getmtime(os.path.join(root, file)))
+
+    return n_files, mtime
+
+
+def is_cache_stale(data_dir, cache_file):
+    """Check whether the data files changed since the cache was packed."""
+    if not os.path.exists(cache_file):
+        return True
+    cache = np.load(cache_file, mmap_mode='r')
+    n_files, mtime = get_source_signature(data_dir)
+
+    return n_files != cache['n_files'] or mtime > cache['mtime']
+
+
+class CachedDatabase:
+    """Database parsed from a data directory and cached as a single file.
+
+    Subclasses parse their data directory in from_directory and list in
+    cache_fields the (name, dtype) of the array attributes they cache, in
+    the order their constructor takes them.
+    """
+
+    cache_fields = ()
+
+    @classmethod
+    def from_directory(cls, data_dir):
+        raise NotImplementedError
+
+    @classmethod
+    def from_cache(cls, cache_file):
+        """Memory-map a database previously packed with write_cache."""
+        cache = np.load(cache_file, mmap_mode='r')
+
+        return cls(*[cache[name] for name, _ in cls.cache_fields])
+
+    def write_cache(self, cache_file, source_signature=(0, 0.0)):
+        """Pack the database into a single memory-mappable binary file."""
+        arrays = [np.asarray(getattr(self, name))
+                  for name, _ in self.cache_fields]
+        cache_dtype = np.dtype(
+            [('n_files', '<i8'), ('mtime', '<f8')] +
+            [(name, dtype, array.shape)
+             for (name, dtype), array in zip(self.cache_fields, arrays)])
+
+        cache = np.zeros((), dtype=cache_dtype)
+        cache['n_files'], cache['mtime'] = source_signature
+        for (name, _), array in zip(self.cache_fields, arrays):
+            cache[name] = array
+
+        np.save(cache_file, cache)
+
+    @classmethod
+    def build_cache(cls, data_dir, cache_file):
+        """Parse the data directory and pack it into the cache file."""
+        source_signature = get_source_signature(data_dir)
+        database = cls.from_directory(data_dir)
+        database.write_cache(cache_file, source_signature)
+
+        return database
+
+    @classmethod
+    def load(cls, data_dir, cache_file):
+        """Load the database from its cache, rebuilding it when stale."""
+        if os.path.isdir(data_dir) and is_cache_stale(data_dir, cache_file):
+            cls.build_cache(data_dir, cache_file)
+
+        return cls.from_cache(cache_file)
@@ -0,0 +1,83 @@
+"""Benchmark the fitness evaluation backends of the GA drivers."""
+
+import os
+import time
+import random
+
+from deap import creator
+
+import airfoil_optimization
+import planform_optimization
+
+from ga_toolbox import EvaluationPool
+
+# %% Benchmark settings
+
+population_size = 500
+n_generations = 10
+backends = ['serial', 'thread', 'process']
+
+
+def get_airfoil_population(population_size):
+    """Return a random population of the airfoil GA."""
+    module = airfoil_optimization
+    return [creator.Individual([
+        random.randint(module.max_camber_min, module.max_camber_max),
+        random.randint(module.max_camber_loc_min, module.max_camber_loc_max),
+        random.randint(module.max_tc_min, module.max_tc_max)])
+        for _ in range(population_size)]
+
+
+def get_planform_population(population_size):
+    """Return a random population of the planform GA."""
+    module = planform_optimization
+    return [creator.Individual([
+        round(random.uniform(module.c_min, module.c_max), 3)
+        for _ in range(len(module.y_stations))])
+        for _ in range(population_size)]
+
+
+def benchmark_backend(module, evaluate, population, backend, n_workers):
+    """Return the evaluated generations per second of a backend."""
+    with EvaluationPool(backend, n_workers, module.init_evaluation,
+                        (module.get_evaluation_state(),)) as pool:
+        start_time = time.perf_counter()
+        for _ in range(n_generations):
+            pool.map(evaluate, population)
+        elapsed_time = time.perf_counter() - start_time
+
+    return n_generations/elapsed_time
+
+
+def main():
+    airfoil_optimization.create_types()
+
+    problems = [
+        ('Airfoil', airfoil_optimization,
+         airfoil_optimization.evaluate_airfoil, get_airfoil_population),
+        ('Planform', planform_optimization,
+         planform_optimization.evaluate_fitness, get_planform_population)]
+
+    n_workers_list = [1]
+    while 2*n_workers_list[-1] <= os.cpu_count():
+        n_workers_list.append(2*n_workers_list[-1])
+
+    for name, module, evaluate, get_population in problems:
+        population = get_population(population_size)
+
+        print('\n--> {0} GA, {1} individuals'.format(name, population_size))
+        print('{0:<10}{1:>10}{2:>16}'.format('Backend', 'Workers',
+                                             'Generations/s'))
+        for backend in backends:
+            for n_workers in n_workers_list:
+                if backend == 'serial' and n_workers > 1:
+                    break
+                generation_rate = benchmark_backend(module, evaluate,
+                                                    population, backend,
+                                                    n_workers)
+                print('{0:<10}{1:>10}{2:>16.2f}'.format(backend, n_workers,
+                                                        generation_rate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,673 @@
+"""Provide shared tools for the DEAP genetic algorithm drivers."""
+
+import os
+import time
+import pickle
+import random
+import warnings
+import multiprocessing
+import numpy as np
+
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from deap import algorithms
+from deap import tools
+
+
+def get_batch_map(evaluate_population):
+    """Return a toolbox map that evaluates a whole generation at once.
+
+    DEAP's algorithms only use toolbox.map to evaluate the invalid
+    individuals of each generation, so replacing it with this map lets a
+    vectorized population evaluator stand in for the per-individual one.
+    """
+    def batch_map(evaluate, individuals):
+        return evaluate_population(list(individuals))
+
+    return batch_map
+
+
+class FitnessCache:
+    """Memoize fitness values keyed on genome and flight condition."""
+
+    def __init__(self, max_size=None, cache_file=None):
+        self.max_size = max_size
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        self._fitnesses = OrderedDict()
+
+        if cache_file is not None and os.path.exists(cache_file):
+            with open(cache_file, 'rb') as file:
+                self._fitnesses.update(pickle.load(file))
+            self._evict()
+
+    def __len__(self):
+        return len(self._fitnesses)
+
+    def _evict(self):
+        """Drop the least recently used entries above the size limit."""
+        if self.max_size is None:
+            return
+        while len(self._fitnesses) > self.max_size:
+            self._fitnesses.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached fitness of a key, or None on a miss."""
+        if key in self._fitnesses:
+            self._fitnesses.move_to_end(key)
+            self.hits += 1
+            return self._fitnesses[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, fitness):
+        """Store the fitness of a key."""
+        self._fitnesses[key] = fitness
+        self._fitnesses.move_to_end(key)
+        self._evict()
+
+    def decorate_batch(self, *conditions):
+        """Return a decorator memoizing a whole-population evaluator.
+
+        Only the cache misses of each generation are handed to the
+        population evaluator, in a single batch.
+        """
+        def decorator(evaluate_population):
+            def cached_evaluate_population(population):
+                keys = [(tuple(individual),) + conditions
+                        for individual in population]
+                fitnesses = [self.get(key) for key in keys]
+
+                missing = {}
+                for key, individual, fitness in zip(keys, population,
+                                                    fitnesses):
+                    if fitness is None:
+                        missing.setdefault(key, individual)
+                computed = {}
+                if missing:
+                    computed = dict(zip(missing, evaluate_population(
+                        list(missing.values()))))
+                    for key, fitness in computed.items():
+                        self.put(key, fitness)
+
+                return [computed[key] if fitness is None else fitness
+                        for key, fitness in zip(keys, fitnesses)]
+            return cached_evaluate_population
+        return decorator
+
+    def save(self, cache_file=None):
+        """Persist the cache so that later runs can reuse it."""
+        cache_file = self.cache_file if cache_file is None else cache_file
+        with open(cache_file, 'wb') as file:
+            pickle.dump(self._fitnesses, file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class SurrogateScreen:
+    """Pre-screen offspring with an RBF surrogate of a scalar fitness.
+
+    Once min_samples exact fitnesses are known, an RBF interpolant of the
+    fitness over the genome and the evaluation conditions is fitted before
+    each batch. Only the screen_fraction of the new genomes with the lowest
+    predicted fitness is evaluated exactly, while the rest keep their
+    prediction. error holds the mean absolute prediction error on the last
+    exactly evaluated batch and n_saved the exact evaluations skipped.
+    """
+
+    def __init__(self, screen_fraction=0.5, min_samples=50,
+                 kernel='thin_plate_spline', smoothing=0.0, neighbors=None):
+        self.screen_fraction = screen_fraction
+        self.min_samples = min_samples
+        self.kernel = kernel
+        self.smoothing = smoothing
+        self.neighbors = neighbors
+        self.n_exact = 0
+        self.n_saved = 0
+        self.error = np.nan
+        self._samples = {}
+
+    def __len__(self):
+        return len(self._samples)
+
+    def get_state(self):
+        """Return the exact samples and counters needed to resume a run."""
+        return {'samples': dict(self._samples), 'n_exact': self.n_exact,
+                'n_saved': self.n_saved, 'error': self.error}
+
+    def set_state(self, state):
+        """Restore the exact samples and counters of get_state."""
+        self._samples = dict(state['samples'])
+        self.n_exact = state['n_exact']
+        self.n_saved = state['n_saved']
+        self.error = state['error']
+
+    def predict(self, features):
+        """Fit the surrogate to the exact samples and predict features."""
+        from scipy.interpolate import RBFInterpolator
+
+        samples = np.array(list(self._samples), dtype=float)
+        values = np.array([fitness[0] for fitness in self._samples.values()])
+        features = np.atleast_2d(np.asarray(features, dtype=float))
+
+        # Constant features, such as a fixed flight condition, would make
+        # the polynomial tail of the interpolant rank deficient.
+        low = samples.min(axis=0)
+        span = samples.max(axis=0) - low
+        varying = span > 0
+
+        model = RBFInterpolator((samples[:, varying] - low[varying]) /
+                                span[varying], values, kernel=self.kernel,
+                                smoothing=self.smoothing,
+                                neighbors=self.neighbors)
+
+        return model((features[:, varying] - low[varying])/span[varying])
+
+    def decorate_batch(self, *conditions):
+        """Return a decorator screening a whole-population evaluator."""
+        def decorator(evaluate_population):
+            def screened_evaluate_population(population):
+                keys = [tuple(individual) + conditions
+                        for individual in population]
+
+                missing = {}
+                for key, individual in zip(keys, population):
+                    if key not in self._samples:
+                        missing.setdefault(key, individual)
+                missing_keys = list(missing)
+
+                predicted = {}
+                exact_keys = missing_keys
+                if len(self._samples) >= self.min_samples and missing_keys:
+                    prediction = self.predict(missing_keys)
+                    n_exact = max(1, int(np.ceil(
+                        self.screen_fraction*len(missing_keys))))
+                    order = np.argsort(prediction, kind='stable')
+                    exact_keys = [missing_keys[i] for i in order[:n_exact]]
+                    predicted = {missing_keys[i]: (prediction[i],)
+                                 for i in order}
+                    self.n_saved += len(missing_keys) - n_exact
+
+                if exact_keys:
+                    fitnesses = evaluate_population(
+                        [missing[key] for key in exact_keys])
+                    self.n_exact += len(exact_keys)
+                    if predicted:
+                        self.error = float(np.mean([
+                            abs(predicted[key][0] - fitness[0])
+                            for key, fitness in zip(exact_keys, fitnesses)]))
+                    self._samples.update(zip(exact_keys, fitnesses))
+
+                return [self._samples[key] if key in self._samples
+                        else predicted[key] for key in keys]
+            return screened_evaluate_population
+        return decorator
+
+
+class EvaluationPool:
+    """Map fitness evaluations onto a serial, thread or process backend.
+
+    The initializer receives the problem state once per worker at pool
+    start-up, so only the individuals themselves are pickled with each
+    task. Serial and thread backends share the parent process memory and
+    run the initializer there instead.
+    """
+
+    def __init__(self, backend='serial', n_workers=None, initializer=None,
+                 initargs=()):
+        self.backend = backend
+        self.n_workers = n_workers or os.cpu_count()
+
+        if backend == 'process':
+            self._pool = multiprocessing.Pool(self.n_workers, initializer,
+                                              initargs)
+        elif backend in ('serial', 'thread'):
+            if initializer is not None:
+                initializer(*initargs)
+            self._pool = None
+            if backend == 'thread':
+                self._pool = ThreadPool(self.n_workers)
+        else:
+            raise ValueError('Unknown evaluation backend: {0}'.format(
+                backend))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def map(self, evaluate, individuals):
+        """Evaluate the individuals and return their fitnesses in order."""
+        individuals = list(individuals)
+        if self._pool is None:
+            return list(map(evaluate, individuals))
+        chunksize = max(1, len(individuals)//(4*self.n_workers))
+        return self._pool.map(evaluate, individuals, chunksize)
+
+    def close(self):
+        """Shut the worker pool down."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def get_pool_backend(backend, vectorized):
+    """Return the evaluation backend a driver can use, warning if ignored.
+
+    Vectorized evaluators process whole generations at once in the parent
+    process, so they always run on the serial backend.
+    """
+    if vectorized and backend != 'serial':
+        warnings.warn("Vectorized evaluations run serially, ignoring "
+                      "backend='{0}'".format(backend), stacklevel=3)
+        return 'serial'
+    return backend
+
+
+# %% Evolution loops
+
+
+class StoppingCriteria:
+    """Decide when a GA run should stop before its generation budget.
+
+    A run stops after patience generations without improving the minimum
+    fitness by more than tolerance, when the population diversity falls
+    below min_diversity, or when it has run for max_time seconds.
+    """
+
+    def __init__(self, patience=None, tolerance=0.0, min_diversity=None,
+                 max_time=None):
+        self.patience = patience
+        self.tolerance = tolerance
+        self.min_diversity = min_diversity
+        self.max_time = max_time
+        self.start()
+
+    def start(self, elapsed=0.0, best_fitness=np.inf, n_stagnant=0):
+        """Reset the stagnation counter and the wall clock."""
+        self.start_time = time.perf_counter() - elapsed
+        self.best_fitness = best_fitness
+        self.n_stagnant = n_stagnant
+
+    def get_state(self):
+        """Return the stagnation state needed to resume a run."""
+        return {'best_fitness': self.best_fitness,
+                'n_stagnant': self.n_stagnant}
+
+    def check(self, min_fitness, diversity=None):
+        """Return the reason to stop after a generation, or None."""
+        if self.best_fitness - min_fitness > self.tolerance:
+            self.best_fitness = min_fitness
+            self.n_stagnant = 0
+        else:
+            self.n_stagnant += 1
+
+        if self.patience is not None and self.n_stagnant >= self.patience:
+            return 'stagnation'
+        if self.min_diversity is not None and diversity is not None and \
+                diversity < self.min_diversity:
+            return 'diversity'
+        if self.max_time is not None and \
+                time.perf_counter() - self.start_time >= self.max_time:
+            return 'max_time'
+        return None
+
+
+def get_diversity(population):
+    """Return the mean per-gene standard deviation of a population."""
+    return float(np.mean(np.std(np.asarray(population, dtype=float),
+                                axis=0)))
+
+
+def _record_generation(logbook, gen, nevals, record, stopping, population,
+                       fitness, verbose):
+    """Record a generation and return the reason to stop, if any."""
+    diversity = None
+    if stopping is not None and stopping.min_diversity is not None:
+        diversity = get_diversity(population)
+        record = dict(record, diversity=diversity)
+    logbook.record(gen=gen, nevals=nevals, **record)
+    if verbose:
+        print(logbook.stream)
+
+    if stopping is None:
+        return None
+    return stopping.check(np.min(fitness), diversity)
+
+
+def save_checkpoint(checkpoint_file, **state):
+    """Atomically pickle a GA state along with the random generator states."""
+    state['random_state'] = random.getstate()
+    state['np_random_state'] = np.random.get_state()
+    with open(checkpoint_file + '.tmp', 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(checkpoint_file + '.tmp', checkpoint_file)
+
+
+def load_checkpoint(checkpoint_file):
+    """Load a GA state written by save_checkpoint.
+
+    The DEAP creator types of the pickled individuals must already exist.
+    """
+    with open(checkpoint_file, 'rb') as file:
+        return pickle.load(file)
+
+
+def _resume_run(checkpoint, stopping):
+    """Restore the random generators and stopping state of a checkpoint."""
+    random.setstate(checkpoint['random_state'])
+    np.random.set_state(checkpoint['np_random_state'])
+    if stopping is not None:
+        stopping.start(checkpoint['elapsed'],
+                       **(checkpoint['stopping'] or {}))
+
+    return time.perf_counter() - checkpoint['elapsed']
+
+
+def _is_checkpoint_due(checkpoint_file, checkpoint_freq, gen, ngen,
+                       stop_reason):
+    """Check whether a checkpoint has to be written after a generation."""
+    return checkpoint_file is not None and (
+        gen % checkpoint_freq == 0 or gen == ngen or stop_reason is not None)
+
+
+def _finish_logbook(logbook, stop_reason, verbose):
+    """Record why the run stopped in the last logbook entry."""
+    logbook[-1]['stop_reason'] = stop_reason
+    if verbose:
+        print('\n--> Stopped by {0} at generation {1}'.format(
+            stop_reason, logbook[-1]['gen']))
+
+
+def ea_simple(population, toolbox, cxpb, mutpb, ngen, stats=None,
+              halloffame=None, verbose=__debug__, stopping=None,
+              checkpoint_file=None, checkpoint_freq=1, resume_from=None,
+              checkpoint_extras=None):
+    """Run DEAP's eaSimple with optional early stopping and checkpoints.
+
+    The evolution is the same as algorithms.eaSimple, except that the
+    StoppingCriteria given in stopping may end it before ngen generations.
+    The reason the run stopped is stored under 'stop_reason' in the last
+    logbook entry.
+
+    Every checkpoint_freq generations the population, hall of fame,
+    logbook and random generator states are written to checkpoint_file.
+    Passing that file as resume_from replaces the given population and hall
+    of fame and continues the run exactly where it was written.
+
+    checkpoint_extras lists further objects whose evolving state shapes
+    the run, such as a SurrogateScreen. Their get_state() is written with
+    each checkpoint and handed back to their set_state() on resume.
+    """
+    checkpoint_extras = checkpoint_extras or []
+
+    if resume_from is None:
+        logbook = tools.Logbook()
+        logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+        if stopping is not None:
+            stopping.start()
+        start_time = time.perf_counter()
+
+        invalid_ind = [ind for ind in population if not ind.fitness.valid]
+        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+        for ind, fit in zip(invalid_ind, fitnesses):
+            ind.fitness.values = fit
+
+        if halloffame is not None:
+            halloffame.update(population)
+
+        record = stats.compile(population) if stats else {}
+        stop_reason = _record_generation(
+            logbook, 0, len(invalid_ind), record, stopping, population,
+            [ind.fitness.values[0] for ind in population], verbose)
+        if _is_checkpoint_due(checkpoint_file, checkpoint_freq, 0, ngen,
+                              stop_reason):
+            save_checkpoint(checkpoint_file, population=population,
+                            halloffame=halloffame, logbook=logbook,
+                            generation=0, stop_reason=stop_reason,
+                            elapsed=time.perf_counter() - start_time,
+                            stopping=stopping and stopping.get_state(),
+                            extras=[extra.get_state()
+                                    for extra in checkpoint_extras])
+        start_gen = 1
+    else:
+        checkpoint = load_checkpoint(resume_from)
+        population = checkpoint['population']
+        logbook = checkpoint['logbook']
+        stop_reason = checkpoint['stop_reason']
+        if halloffame is not None:
+            halloffame.items[:] = checkpoint['halloffame'].items
+            halloffame.keys[:] = checkpoint['halloffame'].keys
+        start_gen = checkpoint['generation'] + 1
+        start_time = _resume_run(checkpoint, stopping)
+        for extra, extra_state in zip(checkpoint_extras,
+                                      checkpoint.get('extras', [])):
+            extra.set_state(extra_state)
+
+    for gen in range(start_gen, ngen + 1):
+        if stop_reason is not None:
+            break
+
+        offspring = toolbox.select(population, len(population))
+        offspring = algorithms.varAnd(offspring, toolbox, cxpb, mutpb)
+
+        invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
+        fitnesses = toolbox.map(toolbox.evaluate, invalid_ind)
+        for ind, fit in zip(invalid_ind, fitnesses):
+            ind.fitness.values = fit
+
+        if halloffame is not None:
+            halloffame.update(offspring)
+
+        population[:] = offspring
+
+        record = stats.compile(population) if stats else {}
+        stop_reason = _record_generation(
+            logbook, gen, len(invalid_ind), record, stopping, population,
+            [ind.fitness.values[0] for ind in population], verbose)
+        if _is_checkpoint_due(checkpoint_file, checkpoint_freq, gen, ngen,
+                              stop_reason):
+            save_checkpoint(checkpoint_file, population=population,
+                            halloffame=halloffame, logbook=logbook,
+                            generation=gen, stop_reason=stop_reason,
+                            elapsed=time.perf_counter() - start_time,
+                            stopping=stopping and stopping.get_state(),
+                            extras=[extra.get_state()
+                                    for extra in checkpoint_extras])
+
+    _finish_logbook(logbook, stop_reason or 'max_generations', verbose)
+
+    return population, logbook
+
+
+# %% Array-backed evolution engine
+#
+# The functions below mirror DEAP's selTournament, cxSimulatedBinaryBounded,
+# mutPolynomialBounded, HallOfFame and eaSimple for a single minimized
+# objective, with the population stored as an (N, n_genes) float array and
+# every operator applied to the whole population at once.
+
+
+def sel_tournament_array(fitness, k, tournsize):
+    """Return the indices of k tournament winners."""
+    aspirants = np.random.randint(0, len(fitness), (k, tournsize))
+    winners = np.argmin(fitness[aspirants], axis=1)
+
+    return aspirants[np.arange(k), winners]
+
+
+def _get_sbx_beta_q(rand, alpha, eta):
+    """Return the SBX spread factor of each gene."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(rand <= 1.0/alpha, (rand*alpha)**(1.0/(eta + 1)),
+                        (1.0/(2.0 - rand*alpha))**(1.0/(eta + 1)))
+
+
+def cx_sbx_bounded_array(parents_1, parents_2, eta, low, up):
+    """Apply bounded simulated binary crossover to paired parent rows."""
+    crossed = (np.random.random(parents_1.shape) <= 0.5) & (
+        np.abs(parents_1 - parents_2) > 1e-14)
+    rand = np.random.random(parents_1.shape)
+    swap = np.random.random(parents_1.shape) <= 0.5
+
+    x1 = np.minimum(parents_1, parents_2)
+    x2 = np.maximum(parents_1, parents_2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = 1.0 + (2.0*(x1 - low)/(x2 - x1))
+        alpha = 2.0 - beta**-(eta + 1)
+        c1 = 0.5*(x1 + x2 - _get_sbx_beta_q(rand, alpha, eta)*(x2 - x1))
+
+        beta = 1.0 + (2.0*(up - x2)/(x2 - x1))
+        alpha = 2.0 - beta**-(eta + 1)
+        c2 = 0.5*(x1 + x2 + _get_sbx_beta_q(rand, alpha, eta)*(x2 - x1))
+
+    c1 = np.clip(c1, low, up)
+    c2 = np.clip(c2, low, up)
+
+    children_1 = np.where(crossed, np.where(swap, c2, c1), parents_1)
+    children_2 = np.where(crossed, np.where(swap, c1, c2), parents_2)
+
+    return children_1, children_2
+
+
+def mut_polynomial_bounded_array(individuals, eta, low, up, indpb):
+    """Apply bounded polynomial mutation to every row."""
+    mutated = np.random.random(individuals.shape) <= indpb
+    rand = np.random.random(individuals.shape)
+
+    delta_1 = (individuals - low)/(up - low)
+    delta_2 = (up - individuals)/(up - low)
+    mut_pow = 1.0/(eta + 1.0)
+
+    with np.errstate(invalid='ignore'):
+        delta_q = np.where(
+            rand < 0.5,
+            (2.0*rand + (1.0 - 2.0*rand)*(1.0 - delta_1)**(eta + 1)
+             )**mut_pow - 1.0,
+            1.0 - (2.0*(1.0 - rand) + 2.0*(rand - 0.5) *
+                   (1.0 - delta_2)**(eta + 1))**mut_pow)
+
+    mutants = np.clip(individuals + delta_q*(up - low), low, up)
+
+    return np.where(mutated, mutants, individuals)
+
+
+def update_hall_of_fame_array(hof, hof_fitness, population, fitness,
+                              maxsize):
+    """Return the best maxsize distinct individuals seen so far."""
+    candidates = np.vstack((hof, population))
+    candidates_fitness = np.concatenate((hof_fitness, fitness))
+
+    candidates, unique_index = np.unique(candidates, axis=0,
+                                         return_index=True)
+    candidates_fitness = candidates_fitness[unique_index]
+    best = np.argsort(candidates_fitness, kind='stable')[:maxsize]
+
+    return candidates[best], candidates_fitness[best]
+
+
+def ea_simple_array(population, evaluate_population, cxpb, mutpb, ngen,
+                    low, up, eta, indpb, tournsize, hof_size, stats=None,
+                    verbose=__debug__, stopping=None, checkpoint_file=None,
+                    checkpoint_freq=1, resume_from=None):
+    """Run DEAP's eaSimple on an array-backed population.
+
+    Individuals are minimized, and the stats are compiled on the (N, 1)
+    array of fitness values. Early stopping and checkpoints work as in
+    ea_simple. Returns the final population, its fitness, the logbook and
+    the (individuals, fitness) arrays of the hall of fame.
+    """
+    if resume_from is None:
+        population = np.array(population, dtype=float)
+        n_individuals = len(population)
+
+        logbook = tools.Logbook()
+        logbook.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+        if stopping is not None:
+            stopping.start()
+        start_time = time.perf_counter()
+
+        fitness = np.asarray(evaluate_population(population),
+                             dtype=float).reshape(n_individuals, -1)[:, 0]
+        hof, hof_fitness = update_hall_of_fame_array(
+            population[:0], fitness[:0], population, fitness, hof_size)
+
+        record = stats.compile(fitness[:, None]) if stats else {}
+        stop_reason = _record_generation(logbook, 0, n_individuals, record,
+                                         stopping, population, fitness,
+                                         verbose)
+        if _is_checkpoint_due(checkpoint_file, checkpoint_freq, 0, ngen,
+                              stop_reason):
+            save_checkpoint(checkpoint_file, population=population,
+                            fitness=fitness, halloffame=(hof, hof_fitness),
+                            logbook=logbook, generation=0,
+                            stop_reason=stop_reason,
+                            elapsed=time.perf_counter() - start_time,
+                            stopping=stopping and stopping.get_state())
+        start_gen = 1
+    else:
+        checkpoint = load_checkpoint(resume_from)
+        population = checkpoint['population']
+        n_individuals = len(population)
+        fitness = checkpoint['fitness']
+        hof, hof_fitness = checkpoint['halloffame']
+        logbook = checkpoint['logbook']
+        stop_reason = checkpoint['stop_reason']
+        start_gen = checkpoint['generation'] + 1
+        start_time = _resume_run(checkpoint, stopping)
+
+    n_pairs = n_individuals//2
+    for gen in range(start_gen, ngen + 1):
+        if stop_reason is not None:
+            break
+
+        selected = sel_tournament_array(fitness, n_individuals, tournsize)
+        offspring = population[selected]
+        offspring_fitness = fitness[selected]
+        valid = np.ones(n_individuals, dtype=bool)
+
+        crossed = np.random.random(n_pairs) < cxpb
+        parents_1 = offspring[0:2*n_pairs:2][crossed]
+        parents_2 = offspring[1:2*n_pairs:2][crossed]
+        children_1, children_2 = cx_sbx_bounded_array(parents_1, parents_2,
+                                                      eta, low, up)
+        crossed_index = 2*np.flatnonzero(crossed)
+        offspring[crossed_index] = children_1
+        offspring[crossed_index + 1] = children_2
+        valid[crossed_index] = valid[crossed_index + 1] = False
+
+        mutated = np.random.random(n_individuals) < mutpb
+        offspring[mutated] = mut_polynomial_bounded_array(
+            offspring[mutated], eta, low, up, indpb)
+        valid[mutated] = False
+
+        invalid_index = np.flatnonzero(~valid)
+        if len(invalid_index):
+            offspring_fitness[invalid_index] = np.asarray(
+                evaluate_population(offspring[invalid_index]),
+                dtype=float).reshape(len(invalid_index), -1)[:, 0]
+
+        hof, hof_fitness = update_hall_of_fame_array(
+            hof, hof_fitness, offspring, offspring_fitness, hof_size)
+
+        population, fitness = offspring, offspring_fitness
+
+        record = stats.compile(fitness[:, None]) if stats else {}
+        stop_reason = _record_generation(logbook, gen, len(invalid_index),
+                                         record, stopping, population,
+                                         fitness, verbose)
+        if _is_checkpoint_due(checkpoint_file, checkpoint_freq, gen, ngen,
+                              stop_reason):
+            save_checkpoint(checkpoint_file, population=population,
+                            fitness=fitness, halloffame=(hof, hof_fitness),
+                            logbook=logbook, generation=gen,
+                            stop_reason=stop_reason,
+                            elapsed=time.perf_counter() - start_time,
+                            stopping=stopping and stopping.get_state())
+
+    _finish_logbook(logbook, stop_reason or 'max_generations', verbose)
+
+    return population, fitness, logbook, (hof, hof_fitness)
@@ -2,30 +2,26 @@
 
 import random
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-import matplotlib.font_manager as font_manager
 
 from deap import base
 from deap import creator
 from deap import tools
-from deap import algorithms
 
-from ambiance import Atmosphere
+from aircraft_plotter import set_plot_style
 
-sns.set_theme(style='darkgrid', font='Palatino Linotype', context='paper')
-FONT_FILE = 'C:/Windows/Fonts/pala.ttf'
-font_manager.fontManager.addfont(FONT_FILE)
+from ga_toolbox import EvaluationPool
+from ga_toolbox import StoppingCriteria
+from ga_toolbox import ea_simple
+from ga_toolbox import ea_simple_array
+from ga_toolbox import get_batch_map
+from ga_toolbox import get_pool_backend
 
+from plot_recorder import recorder
 
 # %% Problem constants
 
 h = 640 # m AMSL
 V = 22  # m/s
-g = Atmosphere(h).grav_accel  # m/s^2
-rho = Atmosphere(h).density  # kg/m^3
-nu = Atmosphere(h).kinematic_viscosity  # m^2/s
 
 WL = 23.239  # kg/m^2
 W0 = 10  # kg
@@ -52,16 +48,15 @@ population_size = 500
 p_crossover = 0.9
 p_mutation = 0.1
 max_generations = 100
+penalty_value = 1
 
+_evaluation_state = {}
 
-def optimize_planform(population_size, max_generations, p_crossover,
-                      p_mutation):
-    """Wing planform shape optimization algorithm."""
-    hall_of_fame_size = 10
-    crowding_factor = 15
-    penalty_value = 1
 
-    toolbox = base.Toolbox()
+def create_types():
+    """Create the DEAP fitness and individual classes."""
+    if hasattr(creator, 'Individual'):
+        return
 
     # Create fitness function class
     creator.create('FitnessMin', base.Fitness, weights=(-1.0,))
@@ -69,6 +64,125 @@ def optimize_planform(population_size, max_generations, p_crossover,
     # Create individual class
     creator.create('Individual', list, fitness=creator.FitnessMin)
 
+
+def get_evaluation_state():
+    """Return the target planform shared with the fitness evaluators."""
+    return {'S': S, 'dy': dy, 'n_sections': n_sections,
+            'ideal_planform': ideal_planform}
+
+
+def get_interpolation_matrix(n_stations, n_points=200):
+    """Return the matrix mapping station chords to the fine planform.
+
+    Each section is sampled at n_points linearly spaced points, so that
+    the fine planform of an (N, n_stations) chord matrix is its product
+    with the transpose of this matrix.
+    """
+    t = np.linspace(0, 1, n_points)
+    interpolation_matrix = np.zeros(((n_stations - 1)*n_points, n_stations))
+    for i in range(n_stations - 1):
+        interpolation_matrix[i*n_points:(i + 1)*n_points, i] = 1 - t
+        interpolation_matrix[i*n_points:(i + 1)*n_points, i + 1] = t
+
+    return interpolation_matrix
+
+
+def init_evaluation(state):
+    """Set the target planform used by the fitness evaluators."""
+    create_types()
+    _evaluation_state.update(state)
+    _evaluation_state['interpolation_matrix'] = get_interpolation_matrix(
+        state['n_sections']//2 + 1)
+
+
+# Feasibility evaluation
+def evaluate_feasibility(individual):
+    """Check whether the planform area is within 1% of the target."""
+    S, dy = _evaluation_state['S'], _evaluation_state['dy']
+    planform = np.array(individual)
+    planform_S = sum((planform[:-1] + planform[1:])/2*dy)
+
+    return abs(2*planform_S - S)/S <= 0.01
+
+
+def distance(individual):
+    """Return the squared planform area error."""
+    S, dy = _evaluation_state['S'], _evaluation_state['dy']
+    planform = np.array(individual)
+    planform_S = sum((planform[:-1] + planform[1:])/2*dy)
+
+    return (2*planform_S - S)**2
+
+
+# Fitness evaluation
+@tools.DeltaPenality(evaluate_feasibility, penalty_value, distance)
+def evaluate_fitness(individual):
+    """Return the mean square error to the ideal elliptical planform."""
+    n_sections = _evaluation_state['n_sections']
+    ideal_planform = _evaluation_state['ideal_planform']
+
+    planform = np.array([])
+    for i in range(n_sections//2):
+        section = np.linspace(individual[i], individual[i+1], 200)
+        planform = np.concatenate((planform, section))
+
+    planform_mse = np.mean((planform - ideal_planform)**2)
+
+    return planform_mse,
+
+
+def evaluate_planforms(population):
+    """Return the penalized fitness of a whole population at once."""
+    S, dy = _evaluation_state['S'], _evaluation_state['dy']
+    chords = np.array(population)
+
+    planforms = chords @ _evaluation_state['interpolation_matrix'].T
+    planform_mse = np.mean(
+        (planforms - _evaluation_state['ideal_planform'])**2, axis=1)
+
+    planform_S = np.sum((chords[:, :-1] + chords[:, 1:])/2*dy, axis=1)
+    feasible = np.abs(2*planform_S - S)/S <= 0.01
+    fitness = np.where(feasible, planform_mse,
+                       penalty_value + (2*planform_S - S)**2)
+
+    return [(value,) for value in fitness]
+
+
+def optimize_planform(population_size, max_generations, p_crossover,
+                      p_mutation, batched=True, backend='serial',
+                      n_workers=None, engine='deap', patience=None,
+                      tolerance=0.0, min_diversity=None, max_time=None,
+                      checkpoint_file=None, checkpoint_freq=10,
+                      resume_from=None, plot_switch=False):
+    """Wing planform shape optimization algorithm.
+
+    engine='array' runs the vectorized array-backed GA instead of DEAP's
+    eaSimple, with the same operators, statistics and hall of fame. The run
+    stops early after patience generations without improving the minimum
+    fitness by more than tolerance, when the mean per-station chord
+    deviation falls below min_diversity or after max_time seconds.
+
+    The GA state is written to checkpoint_file every checkpoint_freq
+    generations, and resume_from continues a run from such a file. The
+    convergence history and best planform are only plotted with
+    plot_switch set.
+
+    backend and n_workers only apply to unbatched runs of the DEAP engine:
+    the batched evaluator and the array engine process whole generations
+    at once in the parent process, so a non-serial backend is ignored with
+    a warning.
+    """
+    hall_of_fame_size = 10
+    crowding_factor = 15
+
+    create_types()
+
+    pool = EvaluationPool(
+        get_pool_backend(backend, batched or engine == 'array'), n_workers,
+        init_evaluation, (get_evaluation_state(),))
+
+    toolbox = base.Toolbox()
+
     def get_chords(c_min, c_max):
         return round(random.uniform(c_min, c_max), 3)
 
@@ -84,34 +198,12 @@ def optimize_planform(population_size, max_generations, p_crossover,
     toolbox.register('population_creator', tools.initRepeat, list,
                      toolbox.individual_creator)
 
-    # Fitness evaluation
-    def evaluate_fitness(individual):
-        planform = np.array([])
-        for i in range(n_sections//2):
-            section = np.linspace(individual[i], individual[i+1], 200)
-            planform = np.concatenate((planform, section))
-
-        planform_mse = np.mean((planform - ideal_planform)**2)
-
-        return planform_mse,
-
-    # Feasibility evaluation
-    def evaluate_feasibility(individual):
-        planform = np.array(individual)
-        planform_S = sum((planform[:-1] + planform[1:])/2*dy)
-
-        return abs(2*planform_S - S)/S <= 0.01
-
-    def distance(individual):
-        planform = np.array(individual)
-        planform_S = sum((planform[:-1] + planform[1:])/2*dy)
-
-        return (2*planform_S - S)**2
-
     # Define geneitc operators
     toolbox.register('evaluate', evaluate_fitness)
-    toolbox.decorate('evaluate', tools.DeltaPenality(evaluate_feasibility,
-                                                     penalty_value, distance))
+    if batched:
+        toolbox.register('map', get_batch_map(evaluate_planforms))
+    else:
+        toolbox.register('map', pool.map)
     toolbox.register('select', tools.selTournament, tournsize=2)
     toolbox.register('mate', tools.cxSimulatedBinaryBounded, low=c_min,
                      up=c_max, eta=crowding_factor)
@@ -120,56 +212,86 @@ def optimize_planform(population_size, max_generations, p_crossover,
 
     population = toolbox.population_creator(n=population_size)
 
-    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    if engine == 'array':
+        stats = tools.Statistics()
+    else:
+        stats = tools.Statistics(lambda ind: ind.fitness.values)
     stats.register('min', np.min)
     stats.register('avg', np.mean)
 
     hof = tools.HallOfFame(hall_of_fame_size)
 
-    population, logbook = algorithms.eaSimple(population, toolbox,
-                                              cxpb=p_crossover,
-                                              mutpb=p_mutation,
-                                              ngen=max_generations,
-                                              stats=stats, halloffame=hof,
-                                              verbose=True)
+    stopping = StoppingCriteria(patience, tolerance, min_diversity, max_time)
+
+    with pool:
+        if engine == 'array':
+            population, fitness, logbook, (hof_items, hof_fitness) = \
+                ea_simple_array(population, evaluate_planforms,
+                                cxpb=p_crossover, mutpb=p_mutation,
+                                ngen=max_generations, low=c_min, up=c_max,
+                                eta=crowding_factor,
+                                indpb=1/len(y_stations), tournsize=2,
+                                hof_size=hall_of_fame_size, stats=stats,
+                                verbose=True, stopping=stopping,
+                                checkpoint_file=checkpoint_file,
+                                checkpoint_freq=checkpoint_freq,
+                                resume_from=resume_from)
+        else:
+            population, logbook = ea_simple(population, toolbox,
+                                            cxpb=p_crossover,
+                                            mutpb=p_mutation,
+                                            ngen=max_generations,
+                                            stats=stats, halloffame=hof,
+                                            verbose=True, stopping=stopping,
+                                            checkpoint_file=checkpoint_file,
+                                            checkpoint_freq=checkpoint_freq,
+                                            resume_from=resume_from)
+            hof_items = hof.items
+            hof_fitness = [item.fitness.values[0] for item in hof.items]
 
     minFitnessValues, meanFitnessValues = logbook.select("min", "avg")
 
-    best_planform = list(map(lambda c: round(c, 3), hof.items[0]))
+    best_planform = list(map(lambda c: round(c, 3), hof_items[0]))
     best_planform = np.array(best_planform)
     best_planform_S = sum((best_planform[:-1] + best_planform[1:])/2*dy)
 
-    print('\n--> Best Fitness = {0}'.format(hof.items[0].fitness.values[0]))
+    print('\n--> Best Fitness = {0}'.format(hof_fitness[0]))
     print('\n--> Best Planform = {0} m'.format(best_planform))
     print('--> Planform Area = {0:.4f} m^2'.format(2*best_planform_S))
 
-    fig = plt.figure(dpi=1200)
-    ax = fig.add_subplot(111)
-    ax.plot(minFitnessValues, color='red', label='Min FV')
-    ax.set_xlabel('Generation')
-    ax.set_ylabel(r'Mean Square Error')
-    ax.set_xlim(left=0)
-    ax.set_ylim(bottom=0)
-
-    ax2 = ax.twinx()
-    ax2.plot(meanFitnessValues, color='green', label='Mean FV')
-    ax2.set_ylabel('Generation Average Mean Square Error')
-    ax2.set_ylim(bottom=0)
-
-    fig = plt.figure(dpi=1200)
-    ax = fig.add_subplot(111)
-    ax.plot(y_stations_fine, ideal_planform)
-    ax.plot(y_stations, np.array(best_planform), color='red')
-    ax.set_xlabel('Span Station, m')
-    ax.set_ylabel('Chord, m')
-    ax.set_xlim(left=0)
-    ax.set_ylim(bottom=0)
+    if plot_switch:
+        fig = recorder.figure('planform_convergence')
+        ax = fig.add_subplot(111)
+        ax.plot(minFitnessValues, color='red', label='Min FV')
+        ax.set_xlabel('Generation')
+        ax.set_ylabel(r'Mean Square Error')
+        ax.set_xlim(left=0)
+        ax.set_ylim(bottom=0)
+
+        ax2 = ax.twinx()
+        ax2.plot(meanFitnessValues, color='green', label='Mean FV')
+        ax2.set_ylabel('Generation Average Mean Square Error')
+        ax2.set_ylim(bottom=0)
+
+        fig = recorder.figure('planform_shape')
+        ax = fig.add_subplot(111)
+        ax.plot(y_stations_fine, ideal_planform)
+        ax.plot(y_stations, np.array(best_planform), color='red')
+        ax.set_xlabel('Span Station, m')
+        ax.set_ylabel('Chord, m')
+        ax.set_xlim(left=0)
+        ax.set_ylim(bottom=0)
 
     return best_planform
 
 
 def main():
-    return optimize_planform(200, 300, 0.9, 0.1)
+    set_plot_style()
+
+    best_planform = optimize_planform(200, 300, 0.9, 0.1, plot_switch=True)
+    recorder.render()
+
+    return best_planform
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""Record figures during a run and render them later on demand."""
+
+import os
+import numpy as np
+
+
+def _snapshot(value):
+    """Return a copy of an argument that later changes cannot affect."""
+    if isinstance(value, np.ndarray):
+        return np.array(value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(_snapshot(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    return value
+
+
+class RecordedObject:
+    """Stand-in for a matplotlib object whose calls are replayed later.
+
+    Attribute and item accesses return further stand-ins, and every call
+    is appended to the calls of its figure with snapshots of its
+    arguments, so that the same code that drives a pyplot figure records
+    it instead.
+    """
+
+    def __init__(self, calls, parent=None, step=None):
+        self._calls = calls
+        self._parent = parent
+        self._step = step
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return RecordedObject(self._calls, self, ('attr', name))
+
+    def __getitem__(self, key):
+        return RecordedObject(self._calls, self, ('item', key))
+
+    def __call__(self, *args, **kwargs):
+        if self._calls is None:
+            return RecordedObject(None)
+        recorded = RecordedObject(self._calls, self, (
+            'call', _snapshot(args), _snapshot(kwargs)))
+        self._calls.append(recorded)
+        return recorded
+
+
+def _replay(value, objects):
+    """Return the matplotlib object or argument a recorded value stands for.
+
+    objects maps the recorded calls already replayed to their results,
+    starting with the root figure.
+    """
+    if isinstance(value, (list, tuple)):
+        return type(value)(_replay(item, objects) for item in value)
+    if isinstance(value, dict):
+        return {key: _replay(item, objects) for key, item in value.items()}
+    if not isinstance(value, RecordedObject):
+        return value
+    if id(value) in objects:
+        return objects[id(value)]
+
+    parent = _replay(value._parent, objects)
+    kind, *step = value._step
+    if kind == 'attr':
+        return getattr(parent, step[0])
+    if kind == 'item':
+        return parent[step[0]]
+
+    args, kwargs = step
+    result = parent(*_replay(args, objects), **_replay(kwargs, objects))
+    objects[id(value)] = result
+
+    return result
+
+
+class PlotRecorder:
+    """Figures recorded as plot calls on arrays, rendered on demand.
+
+    figure() returns a stand-in for a matplotlib figure that records its
+    calls instead of drawing them, so that a run only keeps the plotted
+    arrays. render() later draws every recorded figure on the
+    non-interactive Agg canvas at a chosen DPI and format. A disabled
+    recorder records nothing, which turns plotting off entirely in
+    headless sweeps.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._figures = []
+        self._names = {}
+
+    def __len__(self):
+        return len(self._figures)
+
+    def figure(self, name, **kwargs):
+        """Record a new figure saved as name, with Figure keyword args."""
+        if not self.enabled:
+            return RecordedObject(None)
+
+        # Repeated names, such as those of successive runs, are numbered
+        # so that rendering one figure does not overwrite another.
+        count = self._names.get(name, 0)
+        self._names[name] = count + 1
+        if count:
+            name = '{0}_{1}'.format(name, count)
+
+        figure = RecordedObject([])
+        self._figures.append((name, _snapshot(kwargs), figure))
+
+        return figure
+
+    def clear(self):
+        """Drop every recorded figure."""
+        self._figures = []
+        self._names = {}
+
+    def render(self, output_dir='figures', dpi=300, fmt='png', clear=True):
+        """Draw the recorded figures into output_dir and return their files.
+
+        Figures are drawn on their own Agg canvas instead of through
+        pyplot, so rendering neither opens windows nor changes the pyplot
+        backend of an interactive session.
+        """
+        if not self._figures:
+            return []
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        files = []
+        for name, kwargs, figure in self._figures:
+            fig = Figure(**kwargs)
+            FigureCanvasAgg(fig)
+
+            objects = {id(figure): fig}
+            for recorded in figure._calls:
+                _replay(recorded, objects)
+
+            file = os.path.join(output_dir, '{0}.{1}'.format(name, fmt))
+            fig.savefig(file, dpi=dpi, format=fmt, bbox_inches='tight')
+            files.append(file)
+
+        if clear:
+            self.clear()
+
+        return files
+
+
+recorder = PlotRecorder()
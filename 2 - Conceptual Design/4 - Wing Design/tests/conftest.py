@@ -0,0 +1,23 @@
+"""Run the tests against the wing design modules and their data."""
+
+import os
+import sys
+
+import pytest
+
+WING_DESIGN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules import each other by name and read the airfoil database
+# relative to the wing design directory.
+sys.path.insert(0, WING_DESIGN_DIR)
+os.chdir(WING_DESIGN_DIR)
+
+
+@pytest.fixture
+def empty_polar_point():
+    """Return an airfoil and Re next to empty polars of the database.
+
+    Every alpha of this airfoil interpolates from a non-converged
+    neighbour, so its interpolated polar holds no point at all.
+    """
+    return (5.6026, 4.7362, 22.7092), 136807
@@ -0,0 +1,62 @@
+"""Tests of the conceptual aerodynamics tools."""
+
+import os
+import time
+
+import numpy as np
+import pytest
+
+from aerodynamics_toolbox import get_3D_aerodynamics
+from aerodynamics_toolbox import get_3D_aerodynamics_batch
+from aerodynamics_toolbox import interpolate_airfoil_polar
+from aerodynamics_toolbox import interpolate_airfoil_polars
+from aerodynamics_toolbox import run_xfoil_polar
+from aircraft_plotter import naca_4_series_coords
+
+
+def test_scalar_conversion_penalizes_empty_polars(empty_polar_point):
+    alpha_array, cl_array, cd_array = interpolate_airfoil_polar(
+        *empty_polar_point)
+    assert len(cl_array) < 2
+
+    alpha, CDp = get_3D_aerodynamics(11, 0, 0.8, alpha_array, cl_array,
+                                     cd_array)
+
+    assert np.isnan(alpha)
+    assert CDp == 1
+
+
+def test_scalar_conversion_matches_batch_next_to_empty_polars(
+        empty_polar_point):
+    airfoil, Re = empty_polar_point
+    alpha, CDp = get_3D_aerodynamics(
+        11, 0, 0.8, *interpolate_airfoil_polar(airfoil, Re))
+    alpha_batch, CDp_batch = get_3D_aerodynamics_batch(
+        11, 0, 0.8, *interpolate_airfoil_polars([airfoil], Re))
+
+    np.testing.assert_equal([alpha, CDp], [alpha_batch[0], CDp_batch[0]])
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='the XFoil stub is a shell script')
+def test_hanging_xfoil_runs_are_killed(tmp_path):
+    pid_file = tmp_path/'pids.txt'
+    xfoil_path = tmp_path/'xfoil'
+    xfoil_path.write_text('#!/bin/sh\necho $$ >> {0}\nexec sleep 60\n'.format(
+        pid_file))
+    xfoil_path.chmod(0o755)
+
+    start = time.perf_counter()
+    polar_array, converged = run_xfoil_polar(
+        naca_4_series_coords(2, 4, 12, 50), 2E5, -2, 2, 1, max_retries=1,
+        xfoil_path=str(xfoil_path), timeout=1)
+
+    assert time.perf_counter() - start < 10
+    assert not converged.any()
+    assert np.isnan(polar_array[:, 1:]).all()
+
+    # Both the first attempt and its retry ran and were killed
+    pids = [int(pid) for pid in pid_file.read_text().split()]
+    assert len(pids) == 2
+    for pid in pids:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
@@ -0,0 +1,23 @@
+"""Tests of the airfoil and section optimization evaluators."""
+
+from airfoil_optimization import evaluate_airfoil
+from airfoil_optimization import evaluate_airfoils
+from airfoil_optimization import evaluate_section
+from airfoil_optimization import get_evaluation_state
+from airfoil_optimization import init_evaluation
+
+
+def test_section_next_to_empty_polar_is_penalized(empty_polar_point):
+    airfoil, Re = empty_polar_point
+
+    assert evaluate_section((airfoil, Re, 0.5)) == (1,)
+
+
+def test_airfoil_next_to_empty_polar_is_penalized(empty_polar_point):
+    airfoil, Re = empty_polar_point
+    state = get_evaluation_state()
+    state['Re'] = Re
+    init_evaluation(state)
+
+    assert evaluate_airfoil(airfoil) == (1,)
+    assert evaluate_airfoil(airfoil) == evaluate_airfoils([airfoil])[0]
@@ -0,0 +1,62 @@
+"""Tests of the GA evolution loops."""
+
+import random
+import numpy as np
+import pytest
+
+from deap import tools
+
+import airfoil_optimization
+
+from ga_toolbox import SurrogateScreen
+from ga_toolbox import ea_simple
+from ga_toolbox import get_pool_backend
+
+
+def run_screened_airfoil_ga(ngen, checkpoint_file=None, resume_from=None):
+    """Return the logbook and surrogate of a seeded, screened airfoil GA."""
+    random.seed(7)
+    np.random.seed(7)
+
+    airfoil_optimization.init_evaluation(
+        airfoil_optimization.get_evaluation_state())
+    surrogate = SurrogateScreen(screen_fraction=0.5, min_samples=20)
+    toolbox = airfoil_optimization.create_toolbox(
+        airfoil_optimization.evaluate_airfoil,
+        surrogate.decorate_batch()(airfoil_optimization.evaluate_airfoils))
+    population = toolbox.population_creator(n=30)
+
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    stats.register('min', np.min)
+    stats.register('avg', np.mean)
+    stats.register('saved', lambda fitnesses: surrogate.n_saved)
+
+    _, logbook = ea_simple(population, toolbox, cxpb=0.5, mutpb=0.95,
+                           ngen=ngen, stats=stats, verbose=False,
+                           checkpoint_file=checkpoint_file,
+                           checkpoint_freq=ngen, resume_from=resume_from,
+                           checkpoint_extras=[surrogate])
+
+    return logbook, surrogate
+
+
+def test_screened_resume_matches_uninterrupted_run(tmp_path):
+    checkpoint_file = str(tmp_path/'checkpoint.pkl')
+
+    logbook, surrogate = run_screened_airfoil_ga(8)
+    run_screened_airfoil_ga(4, checkpoint_file=checkpoint_file)
+    resumed_logbook, resumed_surrogate = run_screened_airfoil_ga(
+        8, resume_from=checkpoint_file)
+
+    assert surrogate.n_saved > 0
+    assert resumed_logbook.select('min', 'avg', 'saved') == \
+        logbook.select('min', 'avg', 'saved')
+    assert resumed_surrogate.n_exact == surrogate.n_exact
+    assert resumed_surrogate.n_saved == surrogate.n_saved
+
+
+def test_vectorized_runs_warn_about_ignored_backend():
+    with pytest.warns(UserWarning, match="backend='process'"):
+        assert get_pool_backend('process', vectorized=True) == 'serial'
+    assert get_pool_backend('process', vectorized=False) == 'process'
+    assert get_pool_backend('serial', vectorized=True) == 'serial'
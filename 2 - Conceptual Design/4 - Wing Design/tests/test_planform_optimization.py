@@ -0,0 +1,37 @@
+"""Tests of the planform GA driver."""
+
+import random
+
+import numpy as np
+import pytest
+
+import planform_optimization
+
+
+def run_seeded_planform_ga(backend):
+    """Return the best planform of a short, seeded, unbatched DEAP run."""
+    random.seed(3)
+
+    return planform_optimization.optimize_planform(
+        20, 3, 0.9, 0.1, batched=False, backend=backend, n_workers=2,
+        engine='deap')
+
+
+def test_process_backend_matches_serial_run():
+    # The parent holds no evaluation state, so only the initialized worker
+    # processes can evaluate the process run, which leaves it untouched
+    planform_optimization._evaluation_state.clear()
+    process_planform = run_seeded_planform_ga('process')
+    assert not planform_optimization._evaluation_state
+
+    np.testing.assert_array_equal(process_planform,
+                                  run_seeded_planform_ga('serial'))
+
+
+@pytest.mark.parametrize('batched, engine', [(True, 'deap'),
+                                             (False, 'array')])
+def test_vectorized_runs_warn_about_ignored_backend(batched, engine):
+    with pytest.warns(UserWarning, match="backend='thread'"):
+        planform_optimization.optimize_planform(
+            10, 1, 0.9, 0.1, batched=batched, backend='thread',
+            engine=engine)
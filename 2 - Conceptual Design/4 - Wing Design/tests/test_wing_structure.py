@@ -0,0 +1,76 @@
+"""Tests of the wing spar sizing."""
+
+import time
+
+import numpy as np
+import pytest
+
+from wing_structure import FOS
+from wing_structure import analyze_beam
+from wing_structure import cumulative_trapezoid
+from wing_structure import get_load_cases
+from wing_structure import get_tube_catalog
+from wing_structure import size_spar
+from wing_structure import y_array
+
+
+def size_spar_exhaustively(y_array, q_array, P_array, catalog, v_tip_max,
+                           n_steps):
+    """Return the lightest spar mass over every catalog tube combination."""
+    _, M_array, _, _ = analyze_beam(y_array, q_array, 1.0, P_array)
+    edges = np.linspace(0, len(y_array) - 1, n_steps + 1).round().astype(int)
+
+    mass, v_tip = 0, 0
+    for i, (i_0, i_1) in enumerate(zip(edges[:-1], edges[1:])):
+        y_segment = y_array[i_0:i_1 + 1]
+        M_segment = M_array[:, i_0:i_1 + 1]
+        shape = [1]*n_steps
+        shape[i] = -1
+
+        sigma_array = FOS*np.max(np.abs(M_segment))*catalog['od']/2 / \
+            catalog['I_xx']
+        mass = mass + np.where(
+            sigma_array <= catalog['sigma_y'],
+            catalog['density']*catalog['A']*(y_segment[-1] - y_segment[0]),
+            np.inf).reshape(shape)
+
+        v_weight = np.abs(cumulative_trapezoid(
+            M_segment*(y_array[-1] - y_segment), y_segment)[:, -1])
+        v_tip = v_tip + (v_weight[:, None] /
+                         (catalog['E']*catalog['I_xx'])).reshape(
+                             [len(v_weight)] + shape)
+
+    return 2*np.min(np.where(np.all(v_tip <= v_tip_max, axis=0), mass,
+                             np.inf))
+
+
+@pytest.mark.parametrize('n_steps, od_step', [(1, 1E-3), (2, 2E-3),
+                                              (3, 4E-3)])
+@pytest.mark.parametrize('v_tip_max', [0.02, 0.03, 0.05])
+def test_stepped_spar_matches_exhaustive_search(n_steps, od_step,
+                                                v_tip_max):
+    catalog = get_tube_catalog(np.arange(6E-3, 40.5E-3, od_step),
+                               np.arange(0.5E-3, 2.25E-3, 0.5E-3))
+    q_array, P_array = get_load_cases()
+    P_array = P_array/FOS
+
+    spar_index, spar_mass = size_spar(y_array, q_array, P_array, catalog,
+                                      v_tip_max, n_steps)
+
+    assert spar_mass == pytest.approx(size_spar_exhaustively(
+        y_array, q_array, P_array, catalog, v_tip_max, n_steps))
+    assert len(spar_index) == n_steps
+
+
+def test_large_catalog_is_sized_interactively():
+    catalog = get_tube_catalog(np.arange(6E-3, 40.05E-3, 0.1E-3),
+                               np.arange(0.5E-3, 3.25E-3, 0.025E-3))
+    assert len(catalog) >= 1E5
+    q_array, P_array = get_load_cases()
+
+    start = time.perf_counter()
+    spar_index, _ = size_spar(y_array, q_array, P_array/FOS, catalog, 0.03,
+                              n_steps=3)
+
+    assert time.perf_counter() - start < 5
+    assert len(spar_index) == 3
@@ -0,0 +1,212 @@
+"""Solve the lift distribution of straight multi-trapezoid wings."""
+
+import numpy as np
+
+from collections import OrderedDict
+from scipy.linalg import lu_factor
+from scipy.linalg import lu_solve
+
+
+def get_panel_stations(wing_span, n_panels):
+    """Return the cosine-spaced panel edges and control point stations.
+
+    Control points sit at the cosine midpoints of their panels, which
+    makes the induced drag converge much faster than arithmetic midpoints.
+    """
+    theta = np.linspace(np.pi, 0, 2*n_panels + 1)
+    theta_m = (theta[:-1] + theta[1:])/2
+
+    return wing_span/2*np.cos(theta), wing_span/2*np.cos(theta_m)
+
+
+def get_panel_chords(wing_span, planform, y_array):
+    """Return the chords of a piecewise linear planform at span stations."""
+    y_stations = np.linspace(0, wing_span/2, len(planform))
+
+    return np.interp(np.abs(y_array), y_stations, planform)
+
+
+def get_influence_matrix(x_1, y_1, x_2, y_2, x_m, y_m):
+    """Return the normal velocity induced by unit-strength horseshoes.
+
+    Horseshoe n has its bound vortex from (x_1, y_1) to (x_2, y_2) and its
+    trailing legs running to downstream infinity, all in the wing plane.
+    Row m holds the normal velocities at control point (x_m, y_m).
+    """
+    x_m, y_m = x_m[:, None], y_m[:, None]
+    x_1, y_1, x_2, y_2 = x_1[None], y_1[None], x_2[None], y_2[None]
+
+    r_1 = np.hypot(x_m - x_1, y_m - y_1)
+    r_2 = np.hypot(x_m - x_2, y_m - y_2)
+
+    w_bound = 1/((x_m - x_1)*(y_m - y_2) - (x_m - x_2)*(y_m - y_1))*(
+        ((x_2 - x_1)*(x_m - x_1) + (y_2 - y_1)*(y_m - y_1))/r_1 -
+        ((x_2 - x_1)*(x_m - x_2) + (y_2 - y_1)*(y_m - y_2))/r_2)
+    w_trailing_1 = 1/(y_1 - y_m)*(1 + (x_m - x_1)/r_1)
+    w_trailing_2 = 1/(y_2 - y_m)*(1 + (x_m - x_2)/r_2)
+
+    return (w_bound + w_trailing_1 - w_trailing_2)/(4*np.pi)
+
+
+class FactorizationCache:
+    """LRU cache of factorized vortex lattice systems keyed on geometry.
+
+    Planforms are keyed on their chords and span rounded to decimals, their
+    number of stations and the number of panels, so that nearly identical
+    candidate wings share one factorization. Least recently used systems
+    are dropped once the stored arrays exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes=64*2**20, decimals=3):
+        self.max_bytes = max_bytes
+        self.decimals = decimals
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._systems = OrderedDict()
+
+    def __len__(self):
+        return len(self._systems)
+
+    def get_key(self, wing_span, planform, n_panels):
+        """Return the geometry key of a planform."""
+        return (round(float(wing_span), self.decimals),
+                tuple(np.around(planform, self.decimals).tolist()),
+                len(planform), n_panels)
+
+    def get(self, key):
+        """Return the cached system of a key, or None on a miss."""
+        if key in self._systems:
+            self._systems.move_to_end(key)
+            self.hits += 1
+            return self._systems[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, system):
+        """Store a system and evict the least recently used ones."""
+        if key in self._systems:
+            return
+        self._systems[key] = system
+        self.n_bytes += sum(array.nbytes for array in system)
+        while self.n_bytes > self.max_bytes and len(self._systems) > 1:
+            _, evicted = self._systems.popitem(last=False)
+            self.n_bytes -= sum(array.nbytes for array in evicted)
+
+
+class VortexLatticeWing:
+    """Horseshoe vortex lattice of a wing with an unswept quarter-chord line.
+
+    The planform is given as in create_VSP_wing, by the chords of equally
+    spaced stations from root to tip. Each spanwise panel carries a single
+    horseshoe vortex along its quarter chord with its control point at the
+    three-quarter chord (Weissinger's method), with cosine spanwise
+    spacing and small-angle boundary conditions. The influence matrix is
+    built and LU-factorized once, so that every further angle of attack
+    only costs a back-substitution.
+
+    With a FactorizationCache, the factorized system of a previously seen
+    geometry is reused instead of being rebuilt.
+    """
+
+    def __init__(self, wing_span, planform, n_panels=40, alpha_zl=0.0,
+                 cache=None):
+        self.wing_span = wing_span
+        self.planform = np.asarray(planform, dtype=float)
+        self.n_panels = n_panels
+
+        y_edges, self.y_array = get_panel_stations(wing_span, n_panels)
+        self.dy_array = y_edges[1:] - y_edges[:-1]
+        self.c_array = get_panel_chords(wing_span, self.planform,
+                                        self.y_array)
+
+        y_stations = np.linspace(0, wing_span/2, len(self.planform))
+        self.alpha_zl_array = np.deg2rad(np.interp(
+            np.abs(self.y_array), y_stations,
+            np.broadcast_to(alpha_zl, len(self.planform))))
+
+        self.S = 2*np.sum((self.planform[:-1] + self.planform[1:])/2 *
+                          np.diff(y_stations))
+
+        system = None
+        if cache is not None:
+            key = cache.get_key(wing_span, self.planform, n_panels)
+            system = cache.get(key)
+        if system is None:
+            system = self._factorize(y_edges)
+            if cache is not None:
+                cache.put(key, system)
+        self.lu_piv = system[:2]
+        self.trefftz_matrix = system[2]
+
+    def _factorize(self, y_edges):
+        """Return the LU factors of the influence and Trefftz matrices."""
+        zeros = np.zeros(2*self.n_panels)
+        influence_matrix = get_influence_matrix(
+            zeros, y_edges[:-1], zeros, y_edges[1:], self.c_array/2,
+            self.y_array)
+        lu, piv = lu_factor(influence_matrix)
+
+        # Downwash of the trailing legs alone in the Trefftz plane
+        trefftz_matrix = (
+            1/(y_edges[None, :-1] - self.y_array[:, None]) -
+            1/(y_edges[None, 1:] - self.y_array[:, None]))/(2*np.pi)
+
+        return lu, piv, trefftz_matrix
+
+    def solve(self, alpha_array, V=1.0):
+        """Return the (n_alpha, 2*n_panels) circulations at alphas in deg."""
+        alpha_array = np.atleast_1d(np.deg2rad(alpha_array))
+        rhs = -V*(alpha_array[None, :] - self.alpha_zl_array[:, None])
+
+        return lu_solve(self.lu_piv, rhs).T
+
+    def get_aerodynamics(self, alpha_array):
+        """Return CL, CDi and the panel cl at each angle of attack in deg."""
+        gamma = self.solve(alpha_array)
+
+        cl_array = 2*gamma/self.c_array
+        CL = 2*gamma @ self.dy_array/self.S
+        w_array = gamma @ self.trefftz_matrix.T
+        CDi = -np.sum(gamma*w_array*self.dy_array, axis=1)/self.S
+
+        return CL, CDi, cl_array
+
+    def get_alpha(self, CL):
+        """Return the angle of attack in deg of a wing lift coefficient."""
+        CL_array = self.get_aerodynamics([0, 1])[0]
+
+        return (CL - CL_array[0])/(CL_array[1] - CL_array[0])
+
+    def get_lift_distribution(self, CL):
+        """Return the semi-span stations and section cl at a wing CL.
+
+        Stations run from root to tip, and the local lift per unit span
+        follows as 0.5*rho*V^2*c*cl.
+        """
+        cl_array = self.get_aerodynamics(self.get_alpha(CL))[-1][0]
+        semi_span = slice(self.n_panels, None)
+
+        return (self.y_array[semi_span], self.c_array[semi_span],
+                cl_array[semi_span])
+
+
+def main():
+    wing_span = 2.18  # m
+    planform = [0.252, 0.236, 0.186, 0.1]  # m
+    CL = 0.75
+
+    wing = VortexLatticeWing(wing_span, planform)
+    alpha = wing.get_alpha(CL)
+    _, CDi, _ = wing.get_aerodynamics(alpha)
+    y_array, c_array, cl_array = wing.get_lift_distribution(CL)
+
+    AR = wing_span**2/wing.S
+    e = CL**2/(np.pi*AR*CDi[0])
+    print('--> alpha = {0:.3f} deg, CDi = {1:.5f}, e = {2:.4f}'.format(
+        alpha, CDi[0], e))
+    print('--> Root cl = {0:.4f}'.format(cl_array[0]))
+
+
+if __name__ == "__main__":
+    main()
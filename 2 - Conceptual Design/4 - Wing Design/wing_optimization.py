@@ -0,0 +1,308 @@
+"""Co-optimize wing planform and section for a given flight condition."""
+
+import random
+import numpy as np
+
+from deap import algorithms
+from deap import base
+from deap import creator
+from deap import tools
+
+from aerodynamics_toolbox import interpolate_airfoil_polars
+from aerodynamics_toolbox import get_3D_aerodynamics_batch
+from aerodynamics_toolbox import get_airfoil_database
+
+from aircraft_plotter import set_plot_style
+
+from atmosphere import get_air_properties
+
+from ga_toolbox import FitnessCache
+from ga_toolbox import get_batch_map
+
+from plot_recorder import recorder
+
+from vortex_lattice import FactorizationCache
+from vortex_lattice import VortexLatticeWing
+
+# %% Problem constants
+
+H = 640  # m AMSL
+V = 22  # m/s
+
+WL = 23.239  # kg/m^2
+W0 = 10  # kg
+AR = 11
+
+n_sections = 6
+
+c_min = 0.10  # m
+c_max = 0.50  # m
+
+max_camber_min = 0  # %
+max_camber_max = 6  # %
+max_camber_loc_min = 2  # 10%
+max_camber_loc_max = 6  # 10%
+max_tc_min = 13  # %
+max_tc_max = 25  # %
+
+S = W0/WL  # m^2
+b = round(np.sqrt(AR*S), 2)  # m
+dy = b/n_sections  # m
+y_stations = np.linspace(0, b/2, n_sections//2 + 1)  # m
+n_stations = len(y_stations)
+
+# %% GA - Wing
+
+penalty_value = 1
+
+_evaluation_state = {}
+
+
+def create_types():
+    """Create the DEAP multi-objective fitness and individual classes."""
+    if hasattr(creator, 'WingIndividual'):
+        return
+
+    # CDp, area error and root bending moment are all minimized
+    creator.create('FitnessWing', base.Fitness, weights=(-1.0, -1.0, -1.0))
+
+    # Chords at the span stations followed by the NACA 4-series digits
+    creator.create('WingIndividual', list, fitness=creator.FitnessWing)
+
+
+def get_evaluation_state():
+    """Return the flight condition shared with the fitness evaluators.
+
+    The air properties are looked up here instead of at import, so that
+    importing this module stays cheap.
+    """
+    g, rho, nu = get_air_properties(H)  # m/s^2, kg/m^3, m^2/s
+
+    L = W0*g
+    Lr = L/(np.pi/4*b)
+
+    return {'S': S, 'b': b, 'dy': dy, 'y_stations': y_stations, 'V': V,
+            'rho': rho, 'nu': nu, 'L': L, 'Lr': Lr}
+
+
+def init_evaluation(state):
+    """Set the flight condition used by the fitness evaluators."""
+    create_types()
+    _evaluation_state.update(state)
+    _evaluation_state['factorization_cache'] = FactorizationCache()
+    get_airfoil_database()
+
+
+def get_planform_properties(chords):
+    """Return the area, MGC and mid-chord sweep of (N, n_stations) chords."""
+    dy = _evaluation_state['dy']
+    S_array = (chords[:, :-1] + chords[:, 1:])/2*dy
+
+    S_real = 2*np.sum(S_array, axis=1)
+    MGC = np.around(np.sum((chords[:, :-1] + chords[:, 1:])/2*S_array,
+                           axis=1)/(S_real/2), 3)
+    Lambda_midc = np.sum(np.arctan(
+        (chords[:, 1:] - chords[:, :-1])/(4*dy))*S_array, axis=1)/S_real
+
+    return S_real, MGC, Lambda_midc
+
+
+def get_root_bending_moment(chords):
+    """Return the 1 g spar-root bending moment with lift following chord."""
+    y_stations = _evaluation_state['y_stations']
+    y_0, y_1 = y_stations[:-1], y_stations[1:]
+    c_0, c_1 = chords[:, :-1], chords[:, 1:]
+
+    # First moment and area of each linearly tapered half-wing section
+    S_y = np.sum((y_1 - y_0)*(c_0*(2*y_0 + y_1) + c_1*(y_0 + 2*y_1))/6,
+                 axis=1)
+    S_half = np.sum((y_1 - y_0)*(c_0 + c_1)/2, axis=1)
+
+    return _evaluation_state['L']/2*S_y/S_half
+
+
+def get_vortex_lattice_loads(chords, S_real):
+    """Return the root cl and 1 g root bending moment of each wing.
+
+    Each planform is solved with the vortex lattice at the lift
+    coefficient that carries the weight, reusing the factorized systems of
+    planforms seen before.
+    """
+    b, V, rho = (_evaluation_state['b'], _evaluation_state['V'],
+                 _evaluation_state['rho'])
+    CL_array = _evaluation_state['L']/(0.5*rho*V**2*S_real)
+
+    cl_r = np.empty(len(chords))
+    M_root = np.empty(len(chords))
+    for i, (planform, CL) in enumerate(zip(chords, CL_array)):
+        wing = VortexLatticeWing(
+            b, planform, cache=_evaluation_state['factorization_cache'])
+        y_array, c_array, cl_array = wing.get_lift_distribution(CL)
+        dy_array = wing.dy_array[wing.n_panels:]
+
+        cl_r[i] = np.interp(0, y_array, cl_array)
+        M_root[i] = 0.5*rho*V**2*np.sum(c_array*cl_array*y_array*dy_array)
+
+    return np.around(cl_r, 4), M_root
+
+
+def evaluate_wings(population):
+    """Return the (CDp, area error, root moment) of a whole population."""
+    S, b = _evaluation_state['S'], _evaluation_state['b']
+    V, rho, nu = (_evaluation_state['V'], _evaluation_state['rho'],
+                  _evaluation_state['nu'])
+
+    genes = np.array(population, dtype=float)
+    chords, airfoils = genes[:, :-3], genes[:, -3:]
+
+    S_real, MGC, Lambda_midc = get_planform_properties(chords)
+    Re = V*MGC/nu
+    if _evaluation_state.get('lift_model') == 'vortex_lattice':
+        cl_r, M_root = get_vortex_lattice_loads(chords, S_real)
+    else:
+        cl_r = np.around(2*_evaluation_state['Lr']/(rho*V**2*chords[:, 0]),
+                         4)
+        M_root = get_root_bending_moment(chords)
+
+    # Wings whose Reynolds number falls outside of the airfoil database
+    # are penalized as stalled
+    Re_array = get_airfoil_database().Re_array
+    in_range = (Re >= Re_array[0]) & (Re <= Re_array[-1])
+
+    CDp = np.full(len(genes), float(penalty_value))
+    if in_range.any():
+        alpha_array, cl_arrays, cd_arrays = interpolate_airfoil_polars(
+            airfoils[in_range], Re[in_range])
+        CDp[in_range] = get_3D_aerodynamics_batch(
+            b**2/S_real[in_range], Lambda_midc[in_range], cl_r[in_range],
+            alpha_array, cl_arrays, cd_arrays)[-1]
+
+    area_error = np.abs(S_real - S)/S
+
+    return list(zip(CDp, area_error, M_root))
+
+
+def evaluate_wing(individual):
+    """Return the (CDp, area error, root moment) of a single wing."""
+    return evaluate_wings([individual])[0]
+
+
+def get_wing():
+    """Return random station chords and NACA 4-series digits."""
+    chords = [round(random.uniform(c_min, c_max), 3)
+              for _ in range(n_stations)]
+    airfoil = [random.randint(max_camber_min, max_camber_max),
+               random.randint(max_camber_loc_min, max_camber_loc_max),
+               random.randint(max_tc_min, max_tc_max)]
+
+    return chords + airfoil
+
+
+def mate_wing(ind1, ind2, eta):
+    """Cross chords with SBX and airfoil digits uniformly."""
+    chords_1, chords_2 = tools.cxSimulatedBinaryBounded(
+        ind1[:-3], ind2[:-3], eta=eta, low=c_min, up=c_max)
+    airfoil_1, airfoil_2 = tools.cxUniform(ind1[-3:], ind2[-3:], indpb=1/3)
+    ind1[:] = chords_1 + airfoil_1
+    ind2[:] = chords_2 + airfoil_2
+
+    return ind1, ind2
+
+
+def mutate_wing(individual, eta):
+    """Mutate chords polynomially and airfoil digits uniformly."""
+    chords = tools.mutPolynomialBounded(individual[:-3], eta=eta, low=c_min,
+                                        up=c_max, indpb=1/n_stations)[0]
+    airfoil = tools.mutUniformInt(
+        individual[-3:],
+        low=(max_camber_min, max_camber_loc_min, max_tc_min),
+        up=(max_camber_max, max_camber_loc_max, max_tc_max), indpb=1/3)[0]
+    individual[:] = chords + airfoil
+
+    return individual,
+
+
+def optimize_wing(population_size, max_generations, p_crossover, p_mutation,
+                  cache_size=None, cache_file=None, lift_model='elliptical',
+                  plot_switch=False):
+    """Multi-objective wing planform and section optimization algorithm.
+
+    Chords and NACA 4-series digits are co-evolved with NSGA-II to minimize
+    the wing CDp, the relative area error and the spar-root bending moment.
+    Each generation is evaluated in one vectorized, cached batch. Returns
+    the Pareto front of the run.
+
+    lift_model='vortex_lattice' replaces the elliptical root cl and the
+    chord-proportional bending moment with a vortex lattice solution of
+    each candidate planform. The Pareto front is only plotted with
+    plot_switch set.
+    """
+    crowding_factor = 15
+
+    create_types()
+    state = get_evaluation_state()
+    init_evaluation(dict(state, lift_model=lift_model))
+
+    cache = FitnessCache(cache_size, cache_file)
+    flight_condition = (V, state['rho'], W0, b, lift_model)
+
+    toolbox = base.Toolbox()
+
+    # Create individual generator
+    toolbox.register('individual_creator', tools.initIterate,
+                     creator.WingIndividual, get_wing)
+
+    # Create population generator
+    toolbox.register('population_creator', tools.initRepeat, list,
+                     toolbox.individual_creator)
+
+    # Define geneitc operators
+    toolbox.register('evaluate', evaluate_wing)
+    toolbox.register('map', get_batch_map(
+        cache.decorate_batch(*flight_condition)(evaluate_wings)))
+    toolbox.register('select', tools.selNSGA2)
+    toolbox.register('mate', mate_wing, eta=crowding_factor)
+    toolbox.register('mutate', mutate_wing, eta=crowding_factor)
+
+    population = toolbox.population_creator(n=population_size)
+
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    stats.register('min', np.min, axis=0)
+    stats.register('avg', np.mean, axis=0)
+
+    pareto_front = tools.ParetoFront()
+
+    population, logbook = algorithms.eaMuPlusLambda(
+        population, toolbox, mu=population_size, lambda_=population_size,
+        cxpb=p_crossover, mutpb=p_mutation, ngen=max_generations,
+        stats=stats, halloffame=pareto_front, verbose=True)
+
+    if cache_file is not None:
+        cache.save()
+
+    front = np.array([ind.fitness.values for ind in pareto_front])
+    print('\n--> Pareto front size = {0}'.format(len(pareto_front)))
+
+    if plot_switch:
+        fig = recorder.figure('wing_pareto_front')
+        ax = fig.add_subplot(111)
+        points = ax.scatter(front[:, 2], front[:, 0], c=front[:, 1]*100,
+                            s=8)
+        ax.set_xlabel(r'$\mathdefault{M_{root},~N~m}$')
+        ax.set_ylabel(r'$\mathdefault{C_{D_{p}}}$')
+        fig.colorbar(points, label='Area Error, %')
+
+    return pareto_front
+
+
+def main():
+    set_plot_style()
+
+    pareto_front = optimize_wing(200, 50, 0.6, 0.3, plot_switch=True)
+    recorder.render()
+
+    return pareto_front
+
+
+if __name__ == "__main__":
+    pareto_front = main()
@@ -1,21 +1,16 @@
 """Main wing-spar Euler-Bernoulli beam analysis."""
 
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.font_manager as font_manager
 
-from ambiance import Atmosphere
+from aircraft_plotter import set_plot_style
 
-sns.set_theme(style='darkgrid', font='Palatino Linotype', context='paper')
-FONT_FILE = 'C:/Windows/Fonts/pala.ttf'
-font_manager.fontManager.addfont(FONT_FILE)
+from atmosphere import get_air_properties
 
+from plot_recorder import recorder
 
 # %% Problem constants
 
 H = 640  # m AMSL
-g = Atmosphere(H).grav_accel[0]  # m/s^2
 
 W0 = 10  # kg
 AR = 11
@@ -23,107 +18,378 @@ WL = 23.239  # kg/m^2
 S = W0/WL  # m^2
 b = round(np.sqrt(S*AR), 3)  # m
 dy = 0.01  # m
-y_array = np.arange(0, b/2, dy)
+y_array = np.linspace(0, b/2, int(np.ceil(b/2/dy)) + 1)
 
 FOS = 1.5
 n_p = 3.5
 n_m = -1
 
-L = W0*g
-Lv = L/2*FOS
-Lr = L/(np.pi/4*b)
-L_array = n_p*Lr*np.sqrt(1 - (2*y_array/b)**2)
-
 E = 70E9  # Pa
 r_o_array = np.array([0.7, 0.825, 0.997, 1.12, 1.245])/2 * 0.0254 # m
 r_i_array = (np.array([0.7, 0.825, 0.997, 1.12, 1.245])/2 - 0.037) * 0.0254 # m
 
+v_tip_max = 0.1*b/2  # m
+
+# Young's modulus (Pa), yield or ultimate strength (Pa) and density (kg/m^3)
+MATERIALS = {
+    '6061-T6': (68.9E9, 276E6, 2700),
+    '7075-T6': (71.7E9, 503E6, 2810),
+    'CFRP': (110E9, 900E6, 1550),
+}
+
+# %% Beam solver
+
+
+def cumulative_trapezoid(f_array, x_array):
+    """Integrate along the last axis from the first station, starting at 0."""
+    df_array = (f_array[..., 1:] + f_array[..., :-1])/2*np.diff(x_array)
+    integral = np.cumsum(df_array, axis=-1)
+
+    return np.concatenate((np.zeros_like(integral[..., :1]), integral),
+                          axis=-1)
+
+
+def analyze_beam(y_array, q_array, EI_array, P_tip=0.0):
+    """Return the shear, moment, slope and deflection of a cantilever spar.
+
+    The spar is clamped at the first station of y_array and free at the
+    last one, with the distributed load q_array (..., n_y) and the point
+    load P_tip (...) at its tip. EI_array must broadcast against the
+    moment array, e.g. (n_tubes, 1, 1) for (n_cases, n_y) loads, so that
+    every tube and load case is solved in the same array operation.
+    """
+    q_array = np.asarray(q_array, dtype=float)
+    P_tip = np.asarray(P_tip, dtype=float)[..., None]
+    y_tip = y_array[-1] - y_array[::-1]
+
+    # Integrate the load and the shear inwards from the free tip
+    Q_array = cumulative_trapezoid(q_array[..., ::-1], y_tip)[..., ::-1]
+    V_array = -(Q_array + P_tip)
+    M_array = cumulative_trapezoid(-V_array[..., ::-1], y_tip)[..., ::-1]
+
+    # A spanwise-constant stiffness scales the unit-stiffness solution
+    EI_array = np.asarray(EI_array, dtype=float)
+    if EI_array.ndim == 0 or EI_array.shape[-1] == 1:
+        theta_unit_array = cumulative_trapezoid(M_array, y_array)
+        v_unit_array = cumulative_trapezoid(theta_unit_array, y_array)
+        theta_array = theta_unit_array/EI_array
+        v_array = v_unit_array/EI_array
+    else:
+        theta_array = cumulative_trapezoid(M_array/EI_array, y_array)
+        v_array = cumulative_trapezoid(theta_array, y_array)
+
+    return V_array, M_array, theta_array, v_array
+
+
+# %% Spar sizing tools
+
+
+def get_tube_catalog(od_array, wall_array, materials=MATERIALS):
+    """Return every feasible OD, wall and material tube combination."""
+    od_grid, wall_grid, material_grid = np.meshgrid(
+        od_array, wall_array, np.arange(len(materials)), indexing='ij')
+    valid = 2*wall_grid < od_grid
+    od_grid, wall_grid = od_grid[valid], wall_grid[valid]
+    material_grid = material_grid[valid]
+
+    properties = np.array(list(materials.values()))[material_grid]
+    catalog = np.empty(len(od_grid), dtype=[
+        ('od', float), ('wall', float), ('material', 'U16'), ('E', float),
+        ('sigma_y', float), ('density', float), ('A', float),
+        ('I_xx', float)])
+    catalog['od'], catalog['wall'] = od_grid, wall_grid
+    catalog['material'] = np.array(list(materials))[material_grid]
+    catalog['E'], catalog['sigma_y'], catalog['density'] = properties.T
+    catalog['A'] = np.pi/4*(od_grid**2 - (od_grid - 2*wall_grid)**2)
+    catalog['I_xx'] = np.pi/64*(od_grid**4 - (od_grid - 2*wall_grid)**4)
+
+    return catalog
+
+
+def get_pareto_index(mass_array, compliance_array, block_size=128):
+    """Return the candidates no lighter one matches in compliance.
+
+    compliance_array holds one compliance per candidate, or one per
+    candidate and load case (n_candidates, n_cases), in which case a
+    candidate is dropped only when a lighter one matches it in every case.
+    """
+    compliance_array = np.asarray(compliance_array)
+    if compliance_array.ndim == 2 and compliance_array.shape[1] == 1:
+        compliance_array = compliance_array[:, 0]
+    if compliance_array.ndim == 1:
+        order = np.lexsort((compliance_array, mass_array))
+        best_compliance = np.minimum.accumulate(compliance_array[order])
+        keep = np.concatenate(
+            ([True], compliance_array[order][1:] < best_compliance[:-1]))
+
+        return order[keep]
+
+    summed_array = compliance_array.sum(axis=1)
+    order = np.lexsort((summed_array, mass_array))
+    compliance_array = compliance_array[order]
+
+    # Candidates on the front of the summed compliance can not be matched
+    # in every case by a lighter one, so only the others are tested
+    best_summed = np.minimum.accumulate(summed_array[order])
+    keep = np.concatenate(
+        ([True], summed_array[order][1:] < best_summed[:-1]))
+
+    # The others are tested in blocks against the front of the lighter
+    # blocks and against the lighter candidates of their own block
+    front = np.empty_like(compliance_array)
+    n_front = 0
+    for start in range(0, len(order), block_size):
+        block = compliance_array[start:start + block_size]
+        tested = np.flatnonzero(~keep[start:start + block_size])
+        if len(tested):
+            matched = np.any(np.all(
+                front[None, :n_front] <= block[tested, None], axis=-1),
+                axis=1)
+            matched |= np.any(np.all(
+                block[None] <= block[tested, None], axis=-1) &
+                (np.arange(len(block)) < tested[:, None]), axis=1)
+            keep[start + tested] = ~matched
+
+        kept = block[keep[start:start + block_size]]
+        front[n_front:n_front + len(kept)] = kept
+        n_front += len(kept)
+
+    return order[keep]
+
+
+def size_spar(y_array, q_array, P_array, catalog, v_tip_max, n_steps=1,
+              FOS=FOS):
+    """Find the lightest catalog spar meeting the stress and tip deflection.
+
+    The limit loads are the distributed q_array (n_cases, n_y) and the tip
+    loads P_array (n_cases). Each of the n_steps equal spanwise segments
+    must keep FOS times its peak bending stress below the tube strength,
+    while the limit-load tip deflection of every case must stay below
+    v_tip_max. Tubes that are both heavier and more compliant than another
+    feasible tube are pruned per segment, and segments are merged keeping
+    only the Pareto front of the mass and the compliance of each load case,
+    so that the deflection of each case is checked on its own. The merge
+    is bounded by the spar found against the envelope of the load cases.
+    Returns the catalog index of each segment tube, from root to tip, and
+    the mass of both spar halves.
+    """
+    _, M_array, _, _ = analyze_beam(y_array, q_array, 1.0, P_array)
+
+    # Pareto front of the stress-feasible tubes of each segment, with the
+    # tip deflection of a unit-stiffness segment in each load case found by
+    # virtual work. Every case scales with the same 1/EI within a segment,
+    # so a single compliance orders its tubes.
+    edges = np.linspace(0, len(y_array) - 1, n_steps + 1).round().astype(int)
+    segments = []
+    for i_0, i_1 in zip(edges[:-1], edges[1:]):
+        y_segment = y_array[i_0:i_1 + 1]
+        M_segment = M_array[:, i_0:i_1 + 1]
+        M_max = np.max(np.abs(M_segment))
+        v_weight = np.abs(cumulative_trapezoid(
+            M_segment*(y_array[-1] - y_segment), y_segment)[:, -1])
+
+        sigma_array = FOS*M_max*catalog['od']/2/catalog['I_xx']
+        feasible = np.flatnonzero(sigma_array <= catalog['sigma_y'])
+        mass = (catalog['density']*catalog['A'])[feasible] * \
+            (y_segment[-1] - y_segment[0])
+        compliance = 1/(catalog['E']*catalog['I_xx'])[feasible]
+        pareto = get_pareto_index(mass, compliance)
+        segments.append((feasible[pareto], mass[pareto],
+                         compliance[pareto, None]*v_weight))
+
+    # The envelope of the load cases over each segment quickly gives a
+    # feasible, if slightly heavier, spar whose mass bounds the exact merge
+    envelope_index, envelope_mass = merge_segments(
+        [(feasible, mass, compliance.max(axis=1, keepdims=True))
+         for feasible, mass, compliance in segments], v_tip_max)
+    spar_index, spar_mass = merge_segments(
+        segments, v_tip_max, envelope_mass[0] if len(envelope_mass) else
+        np.inf)
+    if len(spar_mass) == 0:
+        spar_index, spar_mass = envelope_index, envelope_mass
+
+    if len(spar_mass) == 0:
+        raise ValueError('No catalog spar satisfies the stress and '
+                         'deflection limits.')
+
+    return spar_index[0], 2*spar_mass[0]
+
+
+def merge_segments(segments, v_tip_max, max_mass=np.inf):
+    """Return the lightest spar of the segment fronts within v_tip_max.
+
+    Each segment is a (catalog_index, mass, compliance) front, compliance
+    having one column per load case, and partial spars that can not be
+    completed lighter than max_mass are dropped. Returns the catalog index
+    of each segment tube and the half-spar mass of the lightest spar, as
+    arrays holding a single spar, or none when no spar is feasible.
+    """
+    # Bounds of the segments left to merge: their lightest tubes, and their
+    # stiffest ones, last on their fronts, which are the stiffest in every
+    # case and give a feasible completion of a partial spar
+    n_cases = segments[0][2].shape[1]
+    bounds = np.array([
+        [mass.min(), mass[-1], *compliance[-1]]
+        if len(mass) else [np.inf]*(2 + n_cases)
+        for _, mass, compliance in segments])
+    bounds = np.vstack((np.cumsum(bounds[::-1], axis=0)[::-1],
+                        np.zeros(2 + n_cases)))
+    min_mass, stiff_mass = bounds[:, 0], bounds[:, 1]
+    min_compliance = bounds[:, 2:]
+
+    front_mass = np.zeros(1)
+    front_compliance = np.zeros((1, n_cases))
+    front_index = np.zeros((1, 0), dtype=int)
+    for j, (feasible, mass, compliance) in enumerate(segments):
+        merged_mass = (front_mass[:, None] + mass[None]).ravel()
+        merged_compliance = (front_compliance[:, None] +
+                             compliance[None]).reshape(-1, n_cases)
+
+        # Drop the partial spars that can not meet the deflection limit in
+        # some case or that can not beat the lightest feasible completion
+        within = np.flatnonzero(np.all(
+            merged_compliance + min_compliance[j + 1] <= v_tip_max, axis=1))
+        if len(within):
+            best_mass = min(np.min(merged_mass[within]) + stiff_mass[j + 1],
+                            max_mass)
+            within = within[
+                merged_mass[within] + min_mass[j + 1] <= best_mass]
+        if j < len(segments) - 1:
+            pareto = within[get_pareto_index(merged_mass[within],
+                                             merged_compliance[within])]
+        else:
+            # Complete spars only need the lightest one within the limits
+            pareto = within[np.argmin(merged_mass[within], keepdims=True)] \
+                if len(within) else within
+
+        i_front, i_tube = np.divmod(pareto, len(feasible))
+        front_mass = merged_mass[pareto]
+        front_compliance = merged_compliance[pareto]
+        front_index = np.column_stack((front_index[i_front],
+                                       feasible[i_tube]))
+
+    return front_index, front_mass
+
+
 # %% Beam analysis
 
-V_array = np.empty(np.size(y_array))
-M_array = np.empty(np.size(y_array))
-V_array[0] = 0
-M_array[0] = 0
-for i in range(len(y_array) - 1):
-    V_array[i+1] = V_array[i] - dy*L_array[::-1][i]
-    M_array[i+1] = M_array[i] - dy*V_array[i]
-V_array = V_array[::-1]
-M_array = M_array[::-1]
-
-Mv_array = Lv*(b/2 - y_array)
-Vv_array = -Lv*np.ones(np.size(y_array))
-
-fig = plt.figure(dpi=1200)
-ax1 = fig.add_subplot(311)
-ax2 = fig.add_subplot(312)
-ax3 = fig.add_subplot(313)
-
-ax1.plot(y_array, L_array)
-#ax1.plot([y_array[-1], y_array[-1]], [0, Lv])
-ax1.set_xlim(left=0)
-ax1.set_xticklabels([])
-ax1.set_ylabel('L, N')
-ax1.legend([r'$\mathdefault{n_{max}}$', 'Hover'])
-
-ax2.plot(y_array, V_array)
-#ax2.plot(y_array, Vv_array)
-ax2.set_xlim(left=0)
-ax2.set_xticklabels([])
-ax2.set_ylabel('V, N')
-
-ax3.plot(y_array, M_array)
-#ax3.plot(y_array, Mv_array)
-ax3.set_xlim(left=0)
-ax3.set_ylabel(r'$\mathdefault{M,~N~m}$')
-ax3.set_xlim(left=0)
-ax3.set_xlabel('y, m')
-
-v_max_array = np.empty(np.size(r_o_array))
-sigma_max_array = np.empty(np.size(r_o_array))
-sigma_max_v_array = np.empty(np.size(r_o_array))
-v_max_v_array = np.empty(np.size(r_o_array))
-
-for k, r in enumerate(r_o_array):
-    theta_array = np.empty(np.size(y_array))
-    v_array = np.empty(np.size(y_array))
-    theta_array[0] = 0
-    v_array[0] = 0
-
-    theta_v_array = np.empty(np.size(y_array))
-    v_v_array = np.empty(np.size(y_array))
-    theta_v_array[0] = 0
-    v_v_array[0] = 0
-
-    I_xx = np.pi/4*(r_o_array[k]**4 - r_i_array[k]**4)  # m^4
-
-    for i in range(len(y_array) - 1):
-        theta_array[i+1] = theta_array[i] + dy*M_array[i]/(E*I_xx)
-        theta_v_array[i+1] = theta_v_array[i] + dy*Mv_array[i]/(E*I_xx)
-        v_array[i+1] = v_array[i] + dy*theta_array[i]
-        v_v_array[i+1] = v_v_array[i] + dy*theta_v_array[i]
-
-    v_max_array[k] = np.max(v_array)
-    sigma_max_array[k] = np.max(M_array)*r_o_array[k]/I_xx
-
-    v_max_v_array[k] = np.max(v_v_array)
-    sigma_max_v_array[k] = np.max(Mv_array)*r_o_array[k]/I_xx
-
-
-fig = plt.figure(dpi=1200)
-ax1 = fig.add_subplot(211)
-ax2 = fig.add_subplot(212)
-
-ax1.plot(r_o_array*2E3, sigma_max_array*1E-6)
-#ax1.plot(r_o_array*2E3, sigma_max_v_array*1E-6)
-ax1.set_ylabel(r'$\mathdefault{\sigma_{b_{max}},~MPa}$')
-ax1.set_xlim(left=r_o_array[0]*2E3)
-ax1.set_ylim(bottom=0)
-ax1.set_xticklabels([])
-ax1.legend([r'$\mathdefault{n_{max}}$', 'Hover'])
-
-ax2.plot(r_o_array*2E3, v_max_array)
-#ax2.plot(r_o_array*2E3, v_max_v_array)
-ax2.set_xlabel('D, mm')
-ax2.set_ylabel(r'$\mathdefault{\delta_{max},~m}$')
-ax2.set_xlim(left=r_o_array[0]*2E3)
-#ax2.set_ylim(0, 0.)
+
+def get_load_cases():
+    """Return the spanwise and tip loads of the n_p, n_m and hover cases.
+
+    The maneuver cases carry the elliptical lift distribution and the hover
+    case the tip load Lv, which already includes FOS.
+    """
+    g = get_air_properties(H)[0]  # m/s^2
+
+    L = W0*g
+    Lv = L/2*FOS
+    Lr = L/(np.pi/4*b)
+
+    q_array = np.array([n_p, n_m, 0])[:, None]*Lr*np.sqrt(
+        1 - (2*y_array/b)**2)
+    P_array = np.array([0, 0, Lv])
+
+    return q_array, P_array
+
+
+def analyze_tubes(plot_switch=False):
+    """Return the peak stress and deflection of the reference spar tubes."""
+    q_array, P_array = get_load_cases()
+
+    I_xx_array = np.pi/4*(r_o_array**4 - r_i_array**4)  # m^4
+
+    V_array, M_array, theta_array, v_array = analyze_beam(
+        y_array, q_array, E*I_xx_array[:, None, None], P_array)
+
+    L_array = q_array[0]
+    Mv_array = M_array[2]
+    V_array, M_array = V_array[0], M_array[0]
+
+    v_max_array, v_max_v_array = np.max(np.abs(v_array[:, [0, 2]]),
+                                        axis=-1).T
+    sigma_max_array, sigma_max_v_array = (np.max(np.abs(
+        np.array([M_array, Mv_array])), axis=-1)[:, None] *
+        r_o_array/I_xx_array)
+
+    if plot_switch:
+        fig = recorder.figure('spar_loads')
+        ax1 = fig.add_subplot(311)
+        ax2 = fig.add_subplot(312)
+        ax3 = fig.add_subplot(313)
+
+        ax1.plot(y_array, L_array)
+        #ax1.plot([y_array[-1], y_array[-1]], [0, Lv])
+        ax1.set_xlim(left=0)
+        ax1.set_xticklabels([])
+        ax1.set_ylabel('L, N')
+        ax1.legend([r'$\mathdefault{n_{max}}$', 'Hover'])
+
+        ax2.plot(y_array, V_array)
+        ax2.set_xlim(left=0)
+        ax2.set_xticklabels([])
+        ax2.set_ylabel('V, N')
+
+        ax3.plot(y_array, M_array)
+        #ax3.plot(y_array, Mv_array)
+        ax3.set_xlim(left=0)
+        ax3.set_ylabel(r'$\mathdefault{M,~N~m}$')
+        ax3.set_xlim(left=0)
+        ax3.set_xlabel('y, m')
+
+        fig = recorder.figure('spar_tubes')
+        ax1 = fig.add_subplot(211)
+        ax2 = fig.add_subplot(212)
+
+        ax1.plot(r_o_array*2E3, sigma_max_array*1E-6)
+        #ax1.plot(r_o_array*2E3, sigma_max_v_array*1E-6)
+        ax1.set_ylabel(r'$\mathdefault{\sigma_{b_{max}},~MPa}$')
+        ax1.set_xlim(left=r_o_array[0]*2E3)
+        ax1.set_ylim(bottom=0)
+        ax1.set_xticklabels([])
+        ax1.legend([r'$\mathdefault{n_{max}}$', 'Hover'])
+
+        ax2.plot(r_o_array*2E3, v_max_array)
+        #ax2.plot(r_o_array*2E3, v_max_v_array)
+        ax2.set_xlabel('D, mm')
+        ax2.set_ylabel(r'$\mathdefault{\delta_{max},~m}$')
+        ax2.set_xlim(left=r_o_array[0]*2E3)
+        #ax2.set_ylim(0, 0.)
+
+    return sigma_max_array, v_max_array
+
+
+# %% Spar sizing
+
+
+def size_catalog_spars(max_steps=3):
+    """Print the lightest 1 to max_steps step catalog spars."""
+    od_catalog = np.arange(6, 40.5, 0.5)*1E-3  # m
+    wall_catalog = np.arange(0.5, 3.25, 0.25)*1E-3  # m
+    catalog = get_tube_catalog(od_catalog, wall_catalog)
+
+    # Limit loads, removing FOS from the hover tip load
+    q_array, P_array = get_load_cases()
+    P_limit_array = P_array/FOS
+
+    for n_steps in range(1, max_steps + 1):
+        spar_index, spar_mass = size_spar(y_array, q_array, P_limit_array,
+                                          catalog, v_tip_max, n_steps)
+        print('\n--> {0}-step spar mass = {1:.4f} kg'.format(
+            n_steps, spar_mass))
+        for tube in catalog[spar_index]:
+            print('    {0} OD {1:.1f} mm x {2:.2f} mm'.format(
+                tube['material'], tube['od']*1E3, tube['wall']*1E3))
+
+
+def main():
+    set_plot_style()
+
+    analyze_tubes(plot_switch=True)
+    size_catalog_spars()
+
+    recorder.render()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""Make the shared wing design modules importable by the propulsion scripts.
+
+Import this module before any of the shared modules, such as the plot
+recorder, so that every design stage uses the same copy of them.
+"""
+
+import os
+import sys
+
+WING_DESIGN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               os.pardir, '4 - Wing Design')
+
+if WING_DESIGN_DIR not in sys.path:
+    sys.path.append(WING_DESIGN_DIR)
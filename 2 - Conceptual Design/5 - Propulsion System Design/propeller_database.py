@@ -0,0 +1,202 @@
+"""Provide an indexed, memory-mapped propeller performance database."""
+
+import os
+import re
+import numpy as np
+
+import design_paths  # noqa: F401
+
+from data_cache import CachedDatabase
+
+DATA_DIR = 'propeller_data'
+CACHE_FILE = 'propeller_data.npy'
+
+# Columns of the performance tables kept in the database
+VELOCITY_COLUMN = 0  # m/s
+POWER_COLUMN = 5  # W
+THRUST_COLUMN = 7  # N
+
+
+def get_inches(raw):
+    """Return the inches encoded in a propeller name dimension.
+
+    Names drop the decimal point, so that 105 stands for 10.5 in and 875
+    for 8.75 in.
+    """
+    if raw <= 28:
+        return raw
+    elif raw > 28 and raw <= 280:
+        return raw/10
+    elif raw > 280 and raw <= 2800:
+        return raw/100
+    else:
+        return raw/1000
+
+
+def parse_propeller_name(prop):
+    """Return the diameter and pitch in inches of a propeller folder name."""
+    diam_raw, pitch_raw = re.match(r'(\d+)x(\d+)', prop).groups()
+
+    return get_inches(float(diam_raw)), get_inches(float(pitch_raw))
+
+
+class PropellerDatabase(CachedDatabase):
+    """Propeller performance tables stored column-wise in a single array.
+
+    Propellers are sorted by diameter, pitch and name, and the tables of
+    each propeller by RPM, so that the tables of propeller i are the rows
+    table_offsets[i]:table_offsets[i + 1] of rpm_array, and the velocity,
+    power and thrust rows of table j are data_offsets[j]:data_offsets[j + 1]
+    of data_array, sorted by velocity.
+    """
+
+    cache_fields = (('name_array', 'U32'), ('diameter_array', '<f8'),
+                    ('pitch_array', '<f8'), ('table_offsets', '<i8'),
+                    ('rpm_array', '<f8'), ('data_offsets', '<i8'),
+                    ('data_array', '<f8'))
+
+    def __init__(self, name_array, diameter_array, pitch_array,
+                 table_offsets, rpm_array, data_offsets, data_array):
+        self.name_array = np.asarray(name_array)
+        self.diameter_array = np.asarray(diameter_array, dtype=float)
+        self.pitch_array = np.asarray(pitch_array, dtype=float)
+        self.table_offsets = np.asarray(table_offsets)
+        self.rpm_array = np.asarray(rpm_array, dtype=float)
+        self.data_offsets = np.asarray(data_offsets)
+        self.data_array = data_array
+
+    def __len__(self):
+        return len(self.name_array)
+
+    @classmethod
+    def from_directory(cls, data_dir=DATA_DIR):
+        """Load every RPM table of the propeller data directory."""
+        props = []
+        for prop in os.listdir(data_dir):
+            prop_dir = os.path.join(data_dir, prop)
+            if os.path.isdir(prop_dir):
+                props.append(parse_propeller_name(prop) + (prop,))
+        props.sort()
+
+        table_offsets, rpm_list = [0], []
+        data_offsets, data_list = [0], []
+        for _, _, prop in props:
+            prop_dir = os.path.join(data_dir, prop)
+            tables = []
+            for data_file in os.listdir(prop_dir):
+                if not os.path.getsize(os.path.join(prop_dir, data_file)):
+                    continue
+                data = np.loadtxt(os.path.join(prop_dir, data_file),
+                                  usecols=(VELOCITY_COLUMN, POWER_COLUMN,
+                                           THRUST_COLUMN), ndmin=2)
+                tables.append((float(data_file[:-4]), data))
+            tables.sort(key=lambda table: table[0])
+
+            for rpm, data in tables:
+                rpm_list.append(rpm)
+                data_list.append(data[np.argsort(data[:, 0],
+                                                 kind='mergesort')])
+                data_offsets.append(data_offsets[-1] + len(data))
+            table_offsets.append(len(rpm_list))
+
+        diameter_array, pitch_array, name_array = zip(*props)
+
+        return cls(np.array(name_array), diameter_array, pitch_array,
+                   np.array(table_offsets), rpm_list, np.array(data_offsets),
+                   np.concatenate(data_list))
+
+    def select(self, diam_min, diam_max, pitch_min=None, pitch_max=None):
+        """Return the indices of the propellers within the given ranges."""
+        # Propellers are sorted by diameter, so its range is a single slice
+        prop_index = np.arange(
+            np.searchsorted(self.diameter_array, diam_min, side='left'),
+            np.searchsorted(self.diameter_array, diam_max, side='right'))
+
+        pitch_array = self.pitch_array[prop_index]
+        in_range = np.ones(len(prop_index), dtype=bool)
+        if pitch_min is not None:
+            in_range &= pitch_array >= pitch_min
+        if pitch_max is not None:
+            in_range &= pitch_array <= pitch_max
+
+        return prop_index[in_range]
+
+    def interpolate_tables(self, table_index, vel):
+        """Return the power and thrust of RPM tables at a flight velocity.
+
+        Each table is linearly interpolated in velocity, and extrapolated
+        from its end segments, with negative power and thrust clipped to
+        zero, all tables being processed in one vectorized pass.
+        """
+        start = self.data_offsets[table_index]
+        length = self.data_offsets[table_index + 1] - start
+
+        # Data rows of every table, one table after the other
+        segment_start = np.cumsum(length) - length
+        row_index = (np.arange(np.sum(length)) -
+                     np.repeat(segment_start - start, length))
+        vel_data = self.data_array[row_index, 0]
+
+        # Number of rows below vel, which places vel within each table
+        n_below = np.add.reduceat((vel_data < vel).astype(int),
+                                  segment_start)
+        lo = start + np.clip(n_below, 1, length - 1) - 1
+        hi = lo + 1
+
+        x_lo, x_hi = self.data_array[lo, 0], self.data_array[hi, 0]
+        y_lo = np.maximum(self.data_array[lo, 1:], 0)
+        y_hi = np.maximum(self.data_array[hi, 1:], 0)
+        y = y_lo + ((vel - x_lo)/(x_hi - x_lo))[:, None]*(y_hi - y_lo)
+
+        return y[:, 0], y[:, 1]
+
+    def get_performance(self, prop_index, vel):
+        """Return the rpm, thrust, power and efficiency of a propeller."""
+        table_index = np.arange(self.table_offsets[prop_index],
+                                self.table_offsets[prop_index + 1])
+        power_array, thrust_array = self.interpolate_tables(table_index,
+                                                            vel)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            prop_eff_array = thrust_array*vel/power_array
+
+        power_array[power_array < 0] = 0
+        thrust_array[thrust_array < 0] = 0
+        prop_eff_array[prop_eff_array < 0] = 0
+        prop_eff_array[prop_eff_array > 1] = 0
+
+        prop_eff_array[0] = 0
+
+        return (np.array(self.rpm_array[table_index]), thrust_array,
+                power_array, prop_eff_array)
+
+    def query(self, diam_min, diam_max, vel, pitch_min=None, pitch_max=None):
+        """Return the performance at vel of the propellers within ranges.
+
+        Each propeller is returned as its name followed by the rpm, thrust,
+        power and efficiency arrays of get_performance.
+        """
+        return [(str(self.name_array[prop_index]),) +
+                self.get_performance(prop_index, vel)
+                for prop_index in self.select(diam_min, diam_max, pitch_min,
+                                              pitch_max)]
+
+
+def build_cache(data_dir=DATA_DIR, cache_file=CACHE_FILE):
+    """Parse the propeller data directory and pack it into the cache file."""
+    return PropellerDatabase.build_cache(data_dir, cache_file)
+
+
+def load_propeller_database(data_dir=DATA_DIR, cache_file=CACHE_FILE):
+    """Load the propeller database from its cache, rebuilding it when stale."""
+    return PropellerDatabase.load(data_dir, cache_file)
+
+
+def main():
+    database = build_cache()
+    print('--> {0} propellers and {1} RPM tables packed into {2}'.format(
+        len(database), len(database.rpm_array), CACHE_FILE))
+
+
+if __name__ == "__main__":
+    main()